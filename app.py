@@ -1,24 +1,81 @@
-import base64
-import io
+import logging
 import time
+import uuid
 
 import dash
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
-import pandas as pd
-from dash.dependencies import Input, Output, State
+import flask
+from flask_compress import Compress
+from dash.dependencies import ClientsideFunction, Input, Output, State, MATCH
 
 import settings
-from services.stats_service import get_stats
-from errors.messages import file_format_error
+from services.ingest_service import (load_upload, merge_transactions, preflight_upload, read_transactions,
+                                     spool_stream, get_upload_size)
+from services.history_service import (append_transactions, get_history_stats, load_history, history_dataset_key,
+                                      parse_history_dataset_key)
+from services.earnings_service import map_transaction_type_to_title
+from services.aggregation_service import GRANULARITIES
+from services.stats_service import (get_stats, get_summary, get_native_currency, filter_transactions,
+                                    render_totals, render_section, get_cube, render_timeline)
+from errors.alerts import (get_wrong_format_alert, get_unexpected_error_alert, get_processing_error_alert,
+                           get_file_too_large_alert, get_server_busy_alert, get_no_transactions_alert)
+from errors.custom import FileMissingColumn, FileTooLarge, InvalidFileFormat, ServerBusy
+from utils.admission import AdmissionController
+from utils.cache import ResultCache, StreamingUploadKey, upload_key, merged_upload_key, view_key
+from utils.constants import TOTALS_COLUMNS
+from utils.datasets import DatasetStore
+from utils.directories import ensure_private_directory
+from utils.history import HistoryStore, new_history_id, is_history_id
+from utils.jobs import JobStore, no_progress
+from utils.metrics import metrics
+from utils.pool import map_uploads, submit_job
+from utils.profiling import profile_if_slow
+from utils.serialization import dumps, set_dashboard_index, to_json_ready
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
 
 external_stylesheets = [dbc.themes.BOOTSTRAP]
 
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+# Dash would only ever gzip its responses, so compression is set up here from settings instead.
+app = dash.Dash(__name__, external_stylesheets=external_stylesheets, compress=False)
 
 server = app.server
 
+
+@server.after_request
+def observe_compressed_response(response):
+    # Registered before Compress, so it runs after it and sees the size that goes over the wire.
+    if flask.request.path.endswith("_dash-update-component") and response.content_length is not None:
+        metrics.observe("croracle_response_size_bytes", response.content_length, phase="sent",
+                        encoding=response.headers.get("Content-Encoding", "identity"))
+    return response
+
+
+if settings.COMPRESS_ALGORITHMS:
+    server.config.update(
+        COMPRESS_ALGORITHM=settings.COMPRESS_ALGORITHMS,
+        COMPRESS_LEVEL=settings.COMPRESS_GZIP_LEVEL,
+        COMPRESS_BR_LEVEL=settings.COMPRESS_BR_LEVEL,
+        COMPRESS_MIN_SIZE=settings.COMPRESS_MIN_SIZE,
+    )
+    Compress(server)
+
+# The result cache, jobs and histories are unpickled, nobody else may write where they are kept.
+ensure_private_directory(settings.STATE_DIR)
+result_cache = ResultCache(settings.RESULT_CACHE_PATH, settings.RESULT_CACHE_MAX_BYTES,
+                           settings.RESULT_CACHE_TTL_SECONDS)
+job_store = JobStore(settings.JOB_STORE_PATH, settings.JOB_TTL_SECONDS)
+dataset_store = DatasetStore(settings.DATASET_STORE_DIR, settings.DATASET_TTL_SECONDS)
+history_store = HistoryStore(settings.HISTORY_STORE_DIR, settings.HISTORY_TTL_SECONDS)
+admission = AdmissionController(settings.ADMISSION_PATH, settings.ADMISSION_MAX_CONCURRENT,
+                                settings.ADMISSION_MAX_BYTES, settings.ADMISSION_MAX_WAIT_SECONDS,
+                                settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_POLL_INTERVAL_SECONDS)
+
+UPLOAD_STAGES = ["decoded", "parsed", "aggregated", "rendered"]
+
 app.index_string = settings.INDEX_GA_STRING
 
 app.layout = dbc.Container(
@@ -47,90 +104,281 @@ app.layout = dbc.Container(
                 },
                 multiple=True,
             ))),
+        dbc.Row(
+            dbc.Col(dbc.Checklist(
+                id="upload-options",
+                options=[
+                    {"label": "Combine multiple files into one dashboard", "value": "merge"},
+                    {"label": "Add to my saved history", "value": "append"},
+                ],
+                value=[],
+                switch=True,
+                className="upload-options",
+            ))),
         dcc.Loading(
             id="loader",
             type="circle",
             fullscreen=True,
             children=html.Div(id="output-data-upload")
         ),
+        html.Div(id="job-output"),
+        dcc.Store(id="upload-job"),
+        dcc.Store(id="history-id", storage_type="local"),
+        dcc.Interval(id="job-poll", interval=settings.JOB_POLL_INTERVAL_MS, disabled=True),
     ],
     fluid=True
 )
 
 
-def parse_contents(contents, filename, date):
-    content_type, content_string = contents.split(",")
+def parse_contents(contents, filename, date, progress=no_progress):
+    alert = preflight_uploads([contents])
+    if alert is not None:
+        progress("rendered", len(UPLOAD_STAGES))
+        return alert
+    with profile_if_slow(filename):
+        return get_dashboard(upload_key(contents, settings.RESULT_CACHE_VERSION), get_upload_size(contents),
+                             len(UPLOAD_STAGES), progress, load_upload, contents, filename)
+
+
+def parse_merged_contents(list_of_contents, list_of_names, progress=no_progress):
+    steps = count_upload_steps(len(list_of_contents), merge=True)
+    alert = preflight_uploads(list_of_contents)
+    if alert is not None:
+        progress("rendered", steps)
+        return alert
+    cache_key = merged_upload_key(
+        [upload_key(contents, settings.RESULT_CACHE_VERSION) for contents in list_of_contents])
+    with profile_if_slow(", ".join(list_of_names)):
+        return get_dashboard(cache_key, sum(map(get_upload_size, list_of_contents)), steps, progress,
+                             load_merged_uploads, list_of_contents, list_of_names)
+
+
+def parse_appended_contents(list_of_contents, list_of_names, history_id, progress=no_progress):
+    steps = count_upload_steps(len(list_of_contents), merge=True)
+    alert = preflight_uploads(list_of_contents)
+    if alert is not None:
+        progress("rendered", steps)
+        return alert
 
-    decoded = base64.b64decode(content_string)
     try:
-        if "csv" in filename:
-            df = pd.read_csv(io.StringIO(decoded.decode("utf-8")))
-        else:
-            return dbc.Container(html.Div(
-                [
-                    dbc.Row(
-                        dbc.Col([
-                            dbc.Alert([
-                                html.H4("Wrong file format.", className="alert-heading"),
-                                html.P("Only CSV files are allowed at the moment."),
-                                html.Hr(),
-                                html.P("Please make sure that the file you are using has csv extension.",
-                                       className="mb-0"),
-
-                            ],
-                                dismissable=True,
-                                color="danger"
-                            )
-                        ],
-                            width={"size": 6, "offset": 3}
-                        ))
-                ]
-            )
-            )
+        with admission.admit(sum(map(get_upload_size, list_of_contents))):
+            with profile_if_slow(", ".join(list_of_names)):
+                return append_uploads(list_of_contents, list_of_names, history_id, progress)
+    except ServerBusy:
+        progress("rendered", steps)
+        return get_server_busy_alert()
+
+
+def append_uploads(list_of_contents, list_of_names, history_id, progress):
+    try:
+        df = load_merged_uploads(list_of_contents, list_of_names, progress)
     except Exception as e:
-        return dbc.Container(html.Div(
-            [
-                dbc.Row(dbc.Alert([
-                    html.H4("An error has occured", className="alert-heading"),
-                    html.P("There is no descriptive info for this eror"),
-                    html.Hr(),
-                    html.P("Please contact us and mention the below:", className="mb-0"),
-                    html.P(f"Error message: {str(e)}"),
-                    html.P(f"Error class: {type(e)}")
-                ],
-                    dismissable=True,
-                    color="danger")
-                )
-            ]
-        )
-        )
+        return get_unexpected_error_alert(e)
+
+    try:
+        state, _ = append_transactions(history_store, history_id, df)
+        progress("aggregated")
+        stats = get_history_stats(state)
+        if stats is None:
+            # A first upload without any rows leaves the history empty.
+            progress("rendered")
+            return get_no_transactions_alert()
+        stats = to_json_ready(stats)
+        progress("rendered")
+    except Exception as e:
+        logger.exception("Could not append %s to history %s", ", ".join(list_of_names), history_id)
+        return get_processing_error_alert(e)
+
+    return render_dashboard(stats, history_dataset_key(history_id, state["revision"]))
+
+
+def preflight_uploads(list_of_contents):
+    """Alert for the first upload that fails the preflight, or None when all of them pass."""
+    for contents in list_of_contents:
+        try:
+            preflight_upload(contents)
+        except FileTooLarge as e:
+            return get_file_too_large_alert(e)
+        except InvalidFileFormat as e:
+            return get_wrong_format_alert(e)
+        except FileMissingColumn as e:
+            return get_processing_error_alert(e)
+    return None
+
+
+def load_merged_uploads(list_of_contents, list_of_names, progress):
+    return merge_transactions(
+        map_uploads(load_upload, list_of_contents, list_of_names, [progress] * len(list_of_contents)))
+
+
+def count_upload_steps(file_count, merge):
+    if merge and file_count > 1:
+        # Every file is decoded and parsed, the combined frame is aggregated and rendered once.
+        return 2 * file_count + 2
+    return len(UPLOAD_STAGES) * file_count
+
+
+def get_dashboard(cache_key, size, steps, progress, load, *load_args):
+    stats = result_cache.get(cache_key)
+    if stats is not None:
+        progress("rendered", steps)
+        return render_dashboard(stats, cache_key)
+
+    # Cache hits above cost next to nothing, only uploads that are decoded and parsed are admitted.
+    try:
+        with admission.admit(size):
+            return build_dashboard(cache_key, progress, load, *load_args)
+    except ServerBusy:
+        progress("rendered", steps)
+        return get_server_busy_alert()
+
+
+def build_dashboard(cache_key, progress, load, *load_args):
+    try:
+        df = load(*load_args, progress)
+    except Exception as e:
+        return get_unexpected_error_alert(e)
+
+    if df.empty:
+        progress("aggregated")
+        progress("rendered")
+        return get_no_transactions_alert()
 
     try:
         stats = get_stats(df)
+        progress("aggregated")
+        stats = to_json_ready(stats)
+        progress("rendered")
     except Exception as e:
-        print(str(e))
-        return dbc.Container(html.Div(
-            [
-                dbc.Row(dbc.Alert([
-                    html.H4("There was an error processing the file", className="alert-heading"),
-                    html.P(file_format_error),
-                    html.Hr(),
-                    html.P("If everything of those are ok please contact us and mention the below:", className="mb-0"),
-                    html.P(f"Error message: {str(e)}"),
-                    html.P(f"Error class: {type(e)}")
-                ],
-                    dismissable=True,
-                    color="danger")
-                )
-            ]
-        ))
+        logger.exception("Could not build the dashboard of %s", cache_key)
+        return get_processing_error_alert(e)
+
+    dataset_store.save(cache_key, df)
+    result_cache.set(cache_key, stats)
+    return render_dashboard(stats, cache_key)
+
 
+def render_dashboard(stats, dataset_key):
+    index = uuid.uuid4().hex
     return dbc.Container(html.Div(
         [
+            dcc.Store(id={"type": "dataset-key", "index": index}, data=dataset_key),
+            get_filter_bar(index, stats["filters"], stats.get("native_currency")),
+            html.Div(id={"type": "dashboard-totals", "index": index}, children=render_totals_row(stats)),
+            dbc.Row(
+                [
+                    dbc.Col(html.Hr()),
+                ]
+            ),
+            dbc.Tabs(
+                id={"type": "dashboard-tabs", "index": index},
+                active_tab="purchases",
+                children=[
+                    dbc.Tab(label="Breakdown Purchases", tab_id="purchases"),
+                    dbc.Tab(label="Holdings", tab_id="holdings"),
+                    dbc.Tab(label="Breakdown Earnings", tab_id="earnings"),
+                ],
+            ),
+            html.Div(id={"type": "dashboard-section", "index": index}),
+        ],
+        id={"type": "dashboard", "index": index},
+        className="dashboard show-native",
+    ),
+        fluid=True
+    )
+
+
+def get_filter_bar(index, filters, native_currency):
+    return dbc.Row(
+        [
+            dbc.Col(dcc.DatePickerRange(
+                id={"type": "filter-dates", "index": index},
+                min_date_allowed=filters["start_date"],
+                max_date_allowed=filters["end_date"],
+                start_date=filters["start_date"],
+                end_date=filters["end_date"],
+                display_format="YYYY-MM-DD",
+            ), width=4),
+            dbc.Col(dcc.Dropdown(
+                id={"type": "filter-currencies", "index": index},
+                options=[{"label": currency, "value": currency} for currency in filters["currencies"]],
+                multi=True,
+                placeholder="All currencies",
+            ), width=4),
+            dbc.Col(dcc.Dropdown(
+                id={"type": "filter-kinds", "index": index},
+                options=[{"label": map_transaction_type_to_title(kind), "value": kind} for kind in filters["kinds"]],
+                multi=True,
+                placeholder="All transaction kinds",
+            ), width=4),
+            dbc.Col(dbc.RadioItems(
+                id={"type": "timeline-granularity", "index": index},
+                options=[{"label": granularity.title(), "value": granularity} for granularity in GRANULARITIES],
+                value="month",
+                inline=True,
+                className="timeline-granularity",
+            ), width=8),
+            dbc.Col(dbc.RadioItems(
+                id={"type": "currency-toggle", "index": index},
+                options=[{"label": native_currency or "Native currency", "value": "native"},
+                         {"label": "USD", "value": "usd"}],
+                value="native",
+                inline=True,
+                className="currency-toggle",
+            ), width=4),
+        ],
+        className="filter-bar",
+    )
+
+
+def render_totals_row(stats):
+    return dbc.Row(
+        [
+            dbc.Col(stats.get('total_purchases')),
+            dbc.Col(stats.get('total_earnings')),
+        ]
+    )
+
+
+def get_timeline_slot(index):
+    # Filled by update_timeline, so that switching granularity leaves the other charts alone;
+    # the figure is drawn from the store in the browser, in the currency picked there.
+    return html.Div([
+        dcc.Store(id={"type": "timeline-figure", "index": index}),
+        dcc.Graph(id={"type": "timeline", "index": index}),
+    ])
+
+
+def render_purchases_section(stats, index):
+    if stats.get('purchase_alert') is not None:
+        graphs = stats['purchase_alert']
+    else:
+        graphs = html.Div(
+            children=[
+                dbc.Row(
+                    children=[
+                        dbc.Col(stats.get('purchase_bar_chart'), width=6),
+                        dbc.Col(get_timeline_slot(index), width=6)
+                    ],
+                ),
+                dbc.Row(
+                    children=[
+                        dbc.Col(children=stats.get('purchase_scatter_plot'))
+                    ],
+                    no_gutters=True
+                )
+            ],
+        )
+    return html.Div(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(html.H3("Breakdown Purchases", className="row-header"), ),
+                ]
+            ),
             dbc.Row(
                 [
-                    dbc.Col(stats.get('total_purchases')),
-                    dbc.Col(stats.get('total_earnings')),
+                    dbc.Col(html.Div(children=graphs), )
                 ]
             ),
             dbc.Row(
@@ -138,14 +386,40 @@ def parse_contents(contents, filename, date):
                     dbc.Col(html.Hr()),
                 ]
             ),
+        ]
+    )
+
+
+def render_earnings_section(stats, index):
+    graphs = html.Div(
+        children=[
+            dbc.Row(
+                children=[
+                    dbc.Col(stats.get('earnings_pie_chart'), width=6),
+                    dbc.Col(get_timeline_slot(index), width=6)
+                ],
+            ),
+            dbc.Row(
+                children=[
+                    dbc.Col(children=stats.get('earnings_scatter_plot'))
+                ],
+                no_gutters=True
+            )
+        ],
+    )
+    return html.Div(
+        [
             dbc.Row(
                 [
-                    dbc.Col(html.H3("Breakdown Purchases", className="row-header"), ),
+                    dbc.Col(html.H3("Breakdown Earnings", className="row-header"), ),
                 ]
             ),
+            dbc.Row(
+                stats.get('earnings_break_down')
+            ),
             dbc.Row(
                 [
-                    dbc.Col(html.Div(children=stats.get('purchase_graphs')), )
+                    dbc.Col(html.Div(children=graphs), )
                 ]
             ),
             dbc.Row(
@@ -153,17 +427,26 @@ def parse_contents(contents, filename, date):
                     dbc.Col(html.Hr()),
                 ]
             ),
+        ]
+    )
+
+
+def render_holdings_section(stats, index):
+    return html.Div(
+        [
             dbc.Row(
                 [
-                    dbc.Col(html.H3("Breakdown Earnings", className="row-header"), ),
+                    dbc.Col(html.H3("Holdings", className="row-header"), ),
                 ]
             ),
             dbc.Row(
-                stats.get('earnings_break_down')
+                [
+                    dbc.Col(stats.get('holdings_table'), )
+                ]
             ),
             dbc.Row(
                 [
-                    dbc.Col(html.Div(children=stats.get('earning_graphs')), )
+                    dbc.Col(html.Div(children=stats.get('holdings_graphs')), )
                 ]
             ),
             dbc.Row(
@@ -172,25 +455,326 @@ def parse_contents(contents, filename, date):
                 ]
             ),
         ]
-    ),
-        fluid=True
     )
 
 
+SECTION_LAYOUTS = {
+    "purchases": render_purchases_section,
+    "holdings": render_holdings_section,
+    "earnings": render_earnings_section,
+}
+
+
+def load_dataset(dataset_key, columns=None):
+    history = parse_history_dataset_key(dataset_key)
+    if history is not None:
+        return load_history(history_store, *history, columns)
+    return dataset_store.load(dataset_key, columns)
+
+
+def load_filtered_dataset(dataset_key, filters, columns=None):
+    """The filtered frame and its native currency; None, None once the dataset has expired.
+
+    The native currency is None for a dataset without any transaction.
+    """
+    df = load_dataset(dataset_key, columns)
+    if df is None:
+        return None, None
+
+    native_currency = get_native_currency(df)
+    return filter_transactions(df, *filters), native_currency
+
+
+def get_expired_dataset_alert():
+    return get_unexpected_error_alert(LookupError("The uploaded file has expired, please upload it again."))
+
+
+def get_job_progress(job):
+    percentage = int(100 * job["completed"] / max(job["total"], 1))
+    return dbc.Container(html.Div(
+        [
+            dbc.Row(
+                dbc.Col([
+                    dbc.Progress(f"{percentage}%", value=percentage, striped=True, animated=True),
+                    html.P(f"Stage: {job['stage'] or 'queued'}", className="job-stage"),
+                ],
+                    width={"size": 6, "offset": 3}
+                ))
+        ]
+    ))
+
+
+def process_uploads(list_of_contents, upload_options, list_of_names, list_of_dates, history_id,
+                    progress=no_progress):
+    if "append" in upload_options:
+        return [parse_appended_contents(list_of_contents, list_of_names, history_id, progress)]
+    if "merge" in upload_options and len(list_of_contents) > 1:
+        return [parse_merged_contents(list_of_contents, list_of_names, progress)]
+    return map_uploads(parse_contents, list_of_contents, list_of_names, list_of_dates,
+                       [progress] * len(list_of_contents))
+
+
+def run_upload_job(job_id, ticket, list_of_contents, upload_options, list_of_names, list_of_dates, history_id):
+    try:
+        with admission.hold(ticket):
+            children = process_uploads(list_of_contents, upload_options, list_of_names, list_of_dates,
+                                       history_id, job_store.progress(job_id))
+    except Exception as e:
+        job_store.fail(job_id, e)
+    else:
+        job_store.finish(job_id, children)
+
+
 @app.callback(
     Output("output-data-upload", "children"),
+    Output("upload-job", "data"),
+    Output("history-id", "data"),
     Input("upload-data", "contents"),
+    Input("upload-options", "value"),
     State("upload-data", "filename"),
     State("upload-data", "last_modified"),
+    State("history-id", "data"),
 )
-def update_output(list_of_contents, list_of_names, list_of_dates):
-    time.sleep(0.5)
-    if list_of_contents is not None:
-        children = [
-            parse_contents(c, n, d)
-            for c, n, d in zip(list_of_contents, list_of_names, list_of_dates)
-        ]
-        return children
+def update_output(list_of_contents, upload_options, list_of_names, list_of_dates, history_id):
+    if list_of_contents is None:
+        return None, None, history_id
+
+    if not is_history_id(history_id):
+        history_id = new_history_id()
+
+    if settings.BACKGROUND_JOBS:
+        # Admitted here rather than in the job, so that a busy host answers at once and queued jobs count.
+        try:
+            ticket = admission.acquire(sum(map(get_upload_size, list_of_contents)))
+        except ServerBusy:
+            return get_server_busy_alert(), None, history_id
+        combined = "merge" in upload_options or "append" in upload_options
+        job_id = job_store.create(count_upload_steps(len(list_of_contents), combined))
+        future = submit_job(run_upload_job, job_id, ticket, list_of_contents, upload_options, list_of_names,
+                            list_of_dates, history_id)
+        # The job releases the ticket itself, this covers a job that never got to run.
+        future.add_done_callback(lambda _: admission.release(ticket))
+        return None, job_id, history_id
+
+    children = process_uploads(list_of_contents, upload_options, list_of_names, list_of_dates, history_id)
+    return children, None, history_id
+
+
+@app.callback(
+    Output("job-output", "children"),
+    Output("job-poll", "disabled"),
+    Input("job-poll", "n_intervals"),
+    Input("upload-job", "data"),
+)
+def poll_upload_job(n_intervals, job_id):
+    if job_id is None:
+        return None, True
+
+    job = job_store.get(job_id)
+    if job is None:
+        return get_unexpected_error_alert(LookupError("The upload job has expired.")), True
+    if job["status"] == "done":
+        return job["result"], True
+    if job["status"] == "failed":
+        return get_unexpected_error_alert(RuntimeError(job["error"])), True
+    return get_job_progress(job), False
+
+
+FILTER_PROPERTIES = [
+    ({"type": "filter-dates", "index": MATCH}, "start_date"),
+    ({"type": "filter-dates", "index": MATCH}, "end_date"),
+    ({"type": "filter-currencies", "index": MATCH}, "value"),
+    ({"type": "filter-kinds", "index": MATCH}, "value"),
+]
+FILTER_INPUTS = [Input(*filter_property) for filter_property in FILTER_PROPERTIES]
+FILTER_STATES = [State(*filter_property) for filter_property in FILTER_PROPERTIES]
+
+
+@app.callback(
+    Output({"type": "dashboard-totals", "index": MATCH}, "children"),
+    *FILTER_INPUTS,
+    State({"type": "dataset-key", "index": MATCH}, "data"),
+    prevent_initial_call=True,
+)
+def update_totals(start_date, end_date, currencies, kinds, dataset_key):
+    df, native_currency = load_filtered_dataset(dataset_key, [start_date, end_date, currencies, kinds],
+                                                TOTALS_COLUMNS)
+    if df is None:
+        return get_expired_dataset_alert()
+    if native_currency is None:
+        return get_no_transactions_alert()
+    return render_totals_row(render_totals(df, native_currency))
+
+
+@app.callback(
+    Output({"type": "dashboard-section", "index": MATCH}, "children"),
+    Input({"type": "dashboard-tabs", "index": MATCH}, "active_tab"),
+    *FILTER_INPUTS,
+    State({"type": "dataset-key", "index": MATCH}, "data"),
+)
+def update_section(active_tab, start_date, end_date, currencies, kinds, dataset_key):
+    filters = [start_date, end_date, currencies, kinds]
+    if active_tab == "holdings":
+        # Cost basis depends on every transaction before the end date, whatever its currency or kind.
+        filters = [None, end_date, None, None]
+    index = dash.callback_context.outputs_list["id"]["index"]
+    cache_key = view_key(dataset_key, settings.RESULT_CACHE_VERSION, active_tab, filters)
+    section = result_cache.get(cache_key)
+    if section is None:
+        df, native_currency = load_filtered_dataset(dataset_key, filters)
+        if df is None:
+            return get_expired_dataset_alert()
+        if native_currency is None:
+            return get_no_transactions_alert()
+        section = to_json_ready(render_section(active_tab, df, native_currency, index))
+        result_cache.set(cache_key, section)
+    else:
+        # The same dataset may be shown by several dashboards, the cached section may come from another one.
+        set_dashboard_index(section, index)
+    return SECTION_LAYOUTS[active_tab](section, index)
+
+
+@app.callback(
+    Output({"type": "timeline-figure", "index": MATCH}, "data"),
+    Input({"type": "timeline-granularity", "index": MATCH}, "value"),
+    State({"type": "dashboard-tabs", "index": MATCH}, "active_tab"),
+    *FILTER_STATES,
+    State({"type": "dataset-key", "index": MATCH}, "data"),
+)
+def update_timeline(granularity, active_tab, start_date, end_date, currencies, kinds, dataset_key):
+    # Filters and tabs re-render the section, which brings a new timeline and so calls this again.
+    filters = [start_date, end_date, currencies, kinds]
+    cache_key = view_key(dataset_key, settings.RESULT_CACHE_VERSION, "cube", filters)
+    cube = result_cache.get(cache_key)
+    if cube is None:
+        df, native_currency = load_filtered_dataset(dataset_key, filters, TOTALS_COLUMNS)
+        if df is None or native_currency is None:
+            return dash.no_update
+        cube = {"cube": get_cube(df), "native_currency": native_currency}
+        result_cache.set(cache_key, cube)
+    return to_json_ready(render_timeline(active_tab, cube["cube"], granularity, cube["native_currency"]))
+
+
+# The currency toggle, the timeline and the range it selects are handled in the browser by
+# assets/currency.js, from values the figures already carry; none of them reach the server.
+app.clientside_callback(
+    ClientsideFunction(namespace="currency", function_name="showCurrency"),
+    Output({"type": "dashboard", "index": MATCH}, "className"),
+    Input({"type": "currency-toggle", "index": MATCH}, "value"),
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="currency", function_name="drawTimeline"),
+    Output({"type": "timeline", "index": MATCH}, "figure"),
+    Input({"type": "timeline-figure", "index": MATCH}, "data"),
+    Input({"type": "currency-toggle", "index": MATCH}, "value"),
+)
+
+# Every section chart follows the toggle and the timeline of its own dashboard.
+app.clientside_callback(
+    ClientsideFunction(namespace="currency", function_name="switchCurrency"),
+    Output({"type": "currency-graph", "index": MATCH, "name": MATCH}, "figure"),
+    Input({"type": "currency-toggle", "index": MATCH}, "value"),
+    Input({"type": "timeline", "index": MATCH}, "relayoutData"),
+    State({"type": "currency-graph", "index": MATCH, "name": MATCH}, "figure"),
+)
+
+
+@server.before_request
+def start_request_timer():
+    flask.g.request_started = time.perf_counter()
+
+
+@server.after_request
+def observe_callback_request(response):
+    if flask.request.path.endswith("_dash-update-component"):
+        metrics.observe("croracle_request_duration_seconds", time.perf_counter() - flask.g.request_started)
+        if response.content_length is not None:
+            metrics.observe("croracle_response_size_bytes", response.content_length, phase="serialized")
+    return response
+
+
+@server.route("/metrics")
+def get_metrics():
+    cache_stats = result_cache.stats()
+    admission_stats = admission.stats()
+    gauges = {
+        "croracle_result_cache_hits": ("Result cache hits since the cache was created.", cache_stats["hits"]),
+        "croracle_result_cache_misses": ("Result cache misses since the cache was created.", cache_stats["misses"]),
+        "croracle_result_cache_entries": ("Entries in the result cache.", cache_stats["entries"]),
+        "croracle_result_cache_bytes": ("Size of the result cache entries in bytes.", cache_stats["bytes"]),
+        "croracle_admission_max_concurrent": ("Uploads processed at once on the host.",
+                                              admission_stats["max_concurrent"]),
+        "croracle_admission_max_bytes": ("Decoded upload bytes processed at once on the host.",
+                                         admission_stats["max_bytes"]),
+        "croracle_admission_max_queue": ("Uploads allowed to wait for admission on the host.",
+                                         admission_stats["max_queue"]),
+        "croracle_admission_active": ("Uploads being processed, in all processes.", admission_stats["active"]),
+        "croracle_admission_waiting": ("Uploads waiting for admission, in all processes.",
+                                       admission_stats["waiting"]),
+        "croracle_admission_in_flight_bytes": ("Decoded bytes of the uploads being processed, in all processes.",
+                                               admission_stats["in_flight_bytes"]),
+        "croracle_admission_rejected": ("Uploads turned away as busy since the admission file was created.",
+                                        admission_stats["rejected"]),
+    }
+    return flask.Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+# Keys of the summary returned by each part of the aggregates API.
+API_PARTS = {
+    "totals": ["rows", "native_currency", "start_date", "end_date", "total_purchases", "total_purchases_usd",
+               "total_earnings", "total_earnings_usd"],
+    "kinds": ["native_currency", "kinds"],
+    "monthly": ["native_currency", "monthly"],
+}
+
+
+@server.route("/api/aggregates", methods=["POST"])
+@server.route("/api/aggregates/<part>", methods=["POST"])
+def post_aggregates(part=None):
+    """Totals, per-kind totals and monthly series of a raw CSV export sent as the request body."""
+    if part is not None and part not in API_PARTS:
+        return get_api_error(LookupError(f"Unknown part: {part}"), 404)
+
+    key = StreamingUploadKey(settings.RESULT_CACHE_VERSION)
+    try:
+        buffer, upload_format = spool_stream(flask.request.stream, key, flask.request.content_length)
+    except FileTooLarge as e:
+        return get_api_error(e, 413)
+    except (InvalidFileFormat, FileMissingColumn) as e:
+        return get_api_error(e, 400)
+
+    try:
+        with buffer:
+            summary = get_cached_summary(key.hexdigest(), buffer, upload_format)
+    except Exception as e:
+        return get_api_error(e, 422)
+    if part is not None:
+        summary = {name: summary[name] for name in API_PARTS[part]}
+    return flask.Response(dumps(summary), mimetype="application/json")
+
+
+def get_cached_summary(dataset_key, buffer, upload_format):
+    # The key equals the one of the same file uploaded through the page, so its prepared frame is reused.
+    cache_key = view_key(dataset_key, settings.RESULT_CACHE_VERSION, "summary")
+    summary = result_cache.get(cache_key)
+    if summary is not None:
+        return summary
+
+    df = dataset_store.load(dataset_key)
+    if df is None:
+        df = read_transactions(buffer, **upload_format)
+        summary = get_summary(df, monthly=True)
+        dataset_store.save(dataset_key, df)
+    else:
+        summary = get_summary(df, monthly=True)
+    result_cache.set(cache_key, summary)
+    return summary
+
+
+def get_api_error(e, status):
+    return flask.Response(dumps({"error": str(e), "type": type(e).__name__}), status=status,
+                          mimetype="application/json")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+/*
+ * Clientside callbacks of the currency toggle and the timeline, registered in app.py.
+ *
+ * Traces carry the USD values of their native amounts in meta.usd and layouts their title
+ * in both currencies in meta.titles; the native values are kept in meta.native on the first
+ * switch. Nothing here calls the server.
+ */
+(function () {
+    function withCurrency(figure, currency) {
+        var data = (figure.data || []).map(function (trace) {
+            if (!trace.meta || !trace.meta.usd) {
+                return trace;
+            }
+            var key = trace.type === "pie" ? "values" : "y";
+            var meta = trace.meta.native ? trace.meta : Object.assign({}, trace.meta, {native: trace[key]});
+            var updated = Object.assign({}, trace, {meta: meta});
+            updated[key] = meta[currency];
+            return updated;
+        });
+        var layout = figure.layout || {};
+        if (layout.meta && layout.meta.titles) {
+            layout = Object.assign({}, layout, {title: layout.meta.titles[currency]});
+        }
+        return Object.assign({}, figure, {data: data, layout: layout});
+    }
+
+    function withRange(xaxis, relayout) {
+        if (!relayout) {
+            return xaxis;
+        }
+        if (relayout["xaxis.autorange"]) {
+            return Object.assign({}, xaxis, {autorange: true, range: null});
+        }
+        var range = relayout["xaxis.range"];
+        if (!range && relayout["xaxis.range[0]"] !== undefined) {
+            range = [relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]];
+        }
+        return range ? Object.assign({}, xaxis, {autorange: false, range: range}) : xaxis;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        currency: {
+            showCurrency: function (currency) {
+                return "dashboard show-" + currency;
+            },
+
+            drawTimeline: function (figure, currency) {
+                if (!figure) {
+                    return window.dash_clientside.no_update;
+                }
+                return withCurrency(figure, currency);
+            },
+
+            switchCurrency: function (currency, relayout, figure) {
+                if (!figure) {
+                    return window.dash_clientside.no_update;
+                }
+                var updated = withCurrency(figure, currency || "native");
+                if (updated.layout.meta && updated.layout.meta.follows_timeline) {
+                    updated.layout = Object.assign({}, updated.layout, {
+                        xaxis: withRange(updated.layout.xaxis || {}, relayout),
+                    });
+                }
+                return updated;
+            },
+        },
+    });
+})();
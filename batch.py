@@ -0,0 +1,145 @@
+"""Compute the dashboard totals of every export in a directory, without a browser.
+
+    python batch.py exports/ --output totals.jsonl
+    python batch.py exports/ --output totals.parquet --workers 8
+
+Exports are processed in a process pool and one result per file is written as soon as
+it is ready, to JSON Lines or, when pyarrow is installed, Parquet. Files that fail
+are written with their error instead of their totals.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Per-file stage timings would only pile up in the metrics file of the web app.
+os.environ.setdefault("CRORACLE_METRICS_ENABLED", "0")
+
+import pandas as pd  # noqa: E402
+
+from services.ingest_service import load_file  # noqa: E402
+from services.stats_service import get_summary  # noqa: E402
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_EXTENSIONS = (".csv", ".txt", ".gz", ".zip", ".parquet", ".arrow", ".feather")
+
+# Results are written to Parquet in row groups of this many files.
+PARQUET_ROW_GROUP_SIZE = 1000
+
+
+def find_exports(directory, recursive):
+    for root, directories, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            if filename.lower().endswith(EXPORT_EXTENSIONS):
+                yield os.path.join(root, filename)
+        if not recursive:
+            break
+        directories.sort()
+
+
+def process_file(path):
+    started = time.perf_counter()
+    try:
+        result = {"file": path, **get_summary(load_file(path)), "error": None}
+    except Exception as e:
+        result = {"file": path, "rows": 0, "error": f"{type(e).__name__}: {e}"}
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+class JsonLinesWriter:
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    def write(self, result):
+        self.file.write(json.dumps(result) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Results as one row per file. Totals per kind vary between files, so they are kept as JSON."""
+
+    SCHEMA_COLUMNS = [
+        ("file", "string"), ("rows", "int64"), ("native_currency", "string"), ("start_date", "string"),
+        ("end_date", "string"), ("total_purchases", "float64"), ("total_purchases_usd", "float64"),
+        ("total_earnings", "float64"), ("total_earnings_usd", "float64"), ("kinds", "string"),
+        ("error", "string"), ("seconds", "float64"),
+    ]
+
+    def __init__(self, path):
+        if pyarrow is None:
+            raise SystemExit("Parquet output needs pyarrow, install it or write JSON Lines instead.")
+        self.schema = pyarrow.schema([(name, pyarrow.type_for_alias(alias)) for name, alias in self.SCHEMA_COLUMNS])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.rows = []
+
+    def write(self, result):
+        self.rows.append({**result, "kinds": json.dumps(result["kinds"]) if "kinds" in result else None})
+        if len(self.rows) >= PARQUET_ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            frame = pd.DataFrame(self.rows, columns=[name for name, _ in self.SCHEMA_COLUMNS])
+            self.writer.write_table(pyarrow.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+WRITERS = {
+    "jsonl": JsonLinesWriter,
+    "parquet": ParquetWriter,
+}
+
+
+def run(paths, writer, workers):
+    started = time.perf_counter()
+    files = failed = rows = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Results come back in order, so the slowest of the files in flight holds back the others.
+        for result in executor.map(process_file, paths, chunksize=4):
+            writer.write(result)
+            files += 1
+            rows += result["rows"]
+            if result["error"] is not None:
+                failed += 1
+                print(f"{result['file']}: {result['error']}", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+    return {"files": files, "failed": failed, "rows": rows, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the dashboard totals of a directory of CDC exports.")
+    parser.add_argument("directory")
+    parser.add_argument("--output", required=True, help="a .jsonl or .parquet file")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="defaults to the extension of --output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--recursive", action="store_true", help="include exports in subdirectories")
+    args = parser.parse_args()
+
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "jsonl")
+    writer = WRITERS[output_format](args.output)
+    try:
+        totals = run(find_exports(args.directory, args.recursive), writer, args.workers)
+    finally:
+        writer.close()
+
+    seconds = max(totals["seconds"], 1e-9)
+    print(f"{totals['files']:,} files ({totals['failed']:,} failed), {totals['rows']:,} rows in {seconds:.2f} s:"
+          f" {totals['files'] / seconds:,.1f} files/s, {totals['rows'] / seconds:,.0f} rows/s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
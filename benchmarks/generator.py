@@ -0,0 +1,107 @@
+"""Synthetic crypto.com (CDC) exports for benchmarks.
+
+    python -m benchmarks.generator --rows 100000 --output export.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from utils.constants import NEEDED_DF_COLUMNS, TIMESTAMP_FORMAT
+
+# (kind, description template, relative frequency). Card cashback and Earn interest are
+# paid out daily or weekly, so they dominate real exports; purchases are much rarer.
+TRANSACTION_KINDS = [
+    ("referral_card_cashback", "Card Cashback", 40),
+    ("crypto_earn_interest_paid", "Crypto Earn", 25),
+    ("crypto_purchase", "Buy {currency}", 10),
+    ("card_top_up", "Card Top Up", 8),
+    ("mco_stake_reward", "CRO Stake Rewards", 5),
+    ("viban_purchase", "Buy {currency}", 4),
+    ("crypto_withdrawal", "Withdraw {currency}", 3),
+    ("crypto_deposit", "Deposit {currency}", 2),
+    ("reimbursement", "Card Rebate: Netflix", 2),
+    ("referral_gift", "Sign-up Bonus Unlocked", 1),
+]
+
+CURRENCIES = [("CRO", 45), ("BTC", 20), ("ETH", 15), ("ADA", 6), ("DOT", 5), ("USDC", 4), ("LINK", 3), ("XRP", 2)]
+
+LARGE_AMOUNT_KINDS = ["crypto_purchase", "card_top_up", "viban_purchase", "crypto_withdrawal", "crypto_deposit"]
+
+# Kinds whose amount leaves the account and is exported as a negative number.
+OUTFLOW_KINDS = ["card_top_up", "crypto_withdrawal"]
+
+NATIVE_CURRENCY = "EUR"
+USD_RATE = 1.18
+
+
+def generate_export(rows, seed=0, start="2020-01-01", days=730):
+    """Return a frame with ``rows`` transactions in the column layout of a CDC export."""
+    random = np.random.default_rng(seed)
+
+    kind_names = np.array([kind for kind, _, _ in TRANSACTION_KINDS], dtype=object)
+    kinds = pd.Series(kind_names[random.choice(len(TRANSACTION_KINDS), size=rows, p=_weights(TRANSACTION_KINDS))])
+    currency_names = np.array([currency for currency, _ in CURRENCIES], dtype=object)
+    currencies = pd.Series(currency_names[random.choice(len(CURRENCIES), size=rows, p=_weights(CURRENCIES))])
+    # Cashback is always paid in CRO.
+    currencies[kinds == "referral_card_cashback"] = "CRO"
+
+    descriptions = pd.Series(index=kinds.index, dtype=object)
+    for kind, template, _ in TRANSACTION_KINDS:
+        selected = kinds == kind
+        if "{currency}" in template:
+            descriptions[selected] = template.replace("{currency}", "") + currencies[selected]
+        else:
+            descriptions[selected] = template
+
+    # Purchases, top ups and transfers are much larger than the trickle of rewards.
+    native_amounts = np.where(kinds.isin(LARGE_AMOUNT_KINDS),
+                              random.lognormal(4, 1, size=rows), random.lognormal(-1, 1.2, size=rows)).round(2)
+    amounts = (native_amounts / random.uniform(0.5, 50000, size=rows)).round(8)
+    amounts = np.where(kinds.isin(OUTFLOW_KINDS), -amounts, amounts)
+
+    # Fiat wallet purchases spend native currency and receive the crypto as the "To" side.
+    is_viban_purchase = (kinds == "viban_purchase").to_numpy()
+    to_currencies = pd.Series(np.where(is_viban_purchase, currencies, None), dtype=object)
+    to_amounts = np.where(is_viban_purchase, amounts, np.nan)
+    currencies[is_viban_purchase] = NATIVE_CURRENCY
+    amounts = np.where(is_viban_purchase, -native_amounts, amounts)
+
+    # Exports list the newest transactions first.
+    seconds = np.sort(random.integers(0, days * 24 * 60 * 60, size=rows))[::-1]
+    timestamps = pd.Timestamp(start) + pd.to_timedelta(seconds, unit="s")
+
+    return pd.DataFrame({
+        "Timestamp (UTC)": timestamps.strftime(TIMESTAMP_FORMAT),
+        "Transaction Description": descriptions,
+        "Currency": currencies,
+        "Amount": amounts,
+        "To Currency": to_currencies,
+        "To Amount": to_amounts,
+        "Native Currency": NATIVE_CURRENCY,
+        "Native Amount": native_amounts,
+        "Native Amount (in USD)": (native_amounts * USD_RATE).round(2),
+        "Transaction Kind": kinds,
+    })[NEEDED_DF_COLUMNS]
+
+
+def write_export(path, rows, seed=0):
+    generate_export(rows, seed).to_csv(path, index=False)
+
+
+def _weights(choices):
+    weights = np.array([choice[-1] for choice in choices], dtype="float64")
+    return weights / weights.sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CDC export.")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    write_export(args.output, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""Load-test the upload callback of the app running under gunicorn.
+
+    python -m benchmarks.loadtest --rows 1000 10000 100000 --concurrency 8 --workers 4 --duration 60
+    python -m benchmarks.loadtest --url http://localhost:8000 --rows 10000 --requests 200
+
+Starts ``gunicorn -c gunicorn.conf.py app:server`` on a free local port, unless ``--url``
+points to a running server, and replays ``_dash-update-component`` upload requests built
+from synthetic exports of the given sizes, from ``--concurrency`` clients at once. Every
+size gets ``--variants`` different exports and the result cache of the started server is
+off, so that requests are not answered from the cache; pass ``--cache`` to keep it.
+
+Reports throughput, latency percentiles, the error rate and the uploads turned away as
+busy, and samples the RSS of the gunicorn workers and of the pool processes they start
+from /proc while the test runs. A started server keeps its caches, stores, metrics and
+admission tickets in a temporary directory, apart from those of a server running on the
+host. The report is written as JSON so runs from different commits can be compared.
+"""
+import argparse
+import base64
+import itertools
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks import get_commit
+from benchmarks.generator import generate_export
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPDATE_PATH = "/_dash-update-component"
+DEFAULT_ROWS = [1000, 10000]
+PERCENTILES = [50, 95, 99]
+BUSY_MARKER = "The server is busy."
+
+
+def get_payloads(rows, variants):
+    """Base64 data URLs of synthetic exports, as ``dcc.Upload`` sends them, with their row counts."""
+    payloads = []
+    for size in rows:
+        for seed in range(variants):
+            csv = generate_export(size, seed=seed).to_csv(index=False).encode()
+            payloads.append((size, f"export-{size}-{seed}.csv",
+                             "data:text/csv;base64," + base64.b64encode(csv).decode()))
+    return payloads
+
+
+def get_upload_callback(url):
+    """The callback fed by the ``upload-data`` component, as the page's renderer sees it."""
+    with urllib.request.urlopen(url + "/_dash-dependencies") as response:
+        dependencies = json.load(response)
+    for dependency in dependencies:
+        if any(dependency_input["id"] == "upload-data" for dependency_input in dependency["inputs"]):
+            return dependency
+    raise LookupError("The app has no callback with the upload-data component as input.")
+
+
+def get_request_body(callback, contents, filename):
+    values = {
+        ("upload-data", "contents"): [contents],
+        ("upload-data", "filename"): [filename],
+        ("upload-data", "last_modified"): [int(time.time())],
+        ("upload-options", "value"): [],
+    }
+    # Multi-output callbacks are named "..first.prop...second.prop..".
+    outputs = [output.rsplit(".", 1) for output in callback["output"].strip(".").split("...")]
+
+    def with_values(dependencies):
+        return [{**dependency, "value": values.get((dependency["id"], dependency["property"]))}
+                for dependency in dependencies]
+
+    return json.dumps({
+        "output": callback["output"],
+        "outputs": [{"id": component_id, "property": prop} for component_id, prop in outputs],
+        "inputs": with_values(callback["inputs"]),
+        "state": with_values(callback["state"]),
+        "changedPropIds": ["upload-data.contents"],
+    }).encode()
+
+
+def start_server(workers, timeout, cache, state_dir):
+    port = get_free_port()
+    env = {
+        **os.environ,
+        "CRORACLE_DATASET_STORE_DIR": os.path.join(state_dir, "datasets"),
+        "CRORACLE_HISTORY_STORE_DIR": os.path.join(state_dir, "histories"),
+        "CRORACLE_RESULT_CACHE_PATH": os.path.join(state_dir, "results.sqlite3"),
+        "CRORACLE_JOB_STORE_PATH": os.path.join(state_dir, "jobs.sqlite3"),
+        "CRORACLE_METRICS_PATH": os.path.join(state_dir, "metrics.sqlite3"),
+        "CRORACLE_ADMISSION_PATH": os.path.join(state_dir, "admission.sqlite3"),
+        "CRORACLE_SLOW_UPLOAD_PROFILE_DIR": os.path.join(state_dir, "profiles"),
+    }
+    if not cache:
+        env["CRORACLE_RESULT_CACHE_MAX_BYTES"] = "0"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(workers),
+         "--bind", f"127.0.0.1:{port}", "--timeout", str(timeout), "app:server"],
+        cwd=ROOT, env=env)
+    url = f"http://127.0.0.1:{port}"
+    wait_until_ready(url, server)
+    return server, url
+
+
+def get_free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_until_ready(url, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            with urllib.request.urlopen(url + "/", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"gunicorn did not answer on {url} within {timeout} s")
+
+
+def get_process_tree_rss(master_pid):
+    """RSS in bytes of the gunicorn master, of each of its workers and of every process below them.
+
+    Read from /proc; the processes below the workers are their upload and job pools.
+    """
+    children = {}
+    for pid in os.listdir("/proc"):
+        if pid.isdigit():
+            children.setdefault(get_parent_pid(pid), []).append(int(pid))
+
+    rss = {"master": read_rss(master_pid), "workers": {}, "pools": {}}
+    pending = [(pid, "workers") for pid in children.get(master_pid, [])]
+    while pending:
+        pid, kind = pending.pop()
+        process_rss = read_rss(pid)
+        if process_rss is not None:
+            rss[kind][str(pid)] = process_rss
+        pending.extend((child, "pools") for child in children.get(pid, []))
+    return rss
+
+
+def get_parent_pid(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            # The command name may hold spaces, the fields after it do not.
+            return int(stat.read().rsplit(")", 1)[1].split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def read_rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class LoadTest:
+    def __init__(self, url, callback, payloads, concurrency, duration, requests, timeout):
+        self.url = url
+        self.callback = callback
+        self.payloads = itertools.cycle(payloads)
+        self.concurrency = concurrency
+        self.duration = duration
+        self.requests = requests
+        self.timeout = timeout
+        self.results = []
+        self.sent = 0
+        self._lock = threading.Lock()
+        self.started = None
+
+    def run(self, master_pid=None, sample_interval=1.0):
+        self.started = time.perf_counter()
+        clients = [threading.Thread(target=self.run_client, daemon=True) for _ in range(self.concurrency)]
+        for client in clients:
+            client.start()
+
+        samples = []
+        while any(client.is_alive() for client in clients):
+            if master_pid is not None and os.path.isdir("/proc"):
+                with self._lock:
+                    completed = len(self.results)
+                samples.append({"seconds": round(time.perf_counter() - self.started, 2), "completed": completed,
+                                **get_process_tree_rss(master_pid)})
+            for client in clients:
+                client.join(sample_interval / len(clients))
+        return time.perf_counter() - self.started, samples
+
+    def next_payload(self):
+        with self._lock:
+            if self.requests is not None and self.sent >= self.requests:
+                return None
+            if self.duration is not None and time.perf_counter() - self.started >= self.duration:
+                return None
+            self.sent += 1
+            return next(self.payloads)
+
+    def run_client(self):
+        while True:
+            payload = self.next_payload()
+            if payload is None:
+                return
+            result = self.send(*payload)
+            with self._lock:
+                self.results.append(result)
+
+    def send(self, rows, filename, contents):
+        request = urllib.request.Request(self.url + UPDATE_PATH,
+                                         data=get_request_body(self.callback, contents, filename),
+                                         headers={"Content-Type": "application/json"})
+        started = time.perf_counter()
+        result = {"rows": rows, "started": round(started - self.started, 3), "status": None, "error": None,
+                  "busy": False}
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = response.read()
+                result["status"] = response.status
+                result["busy"] = BUSY_MARKER.encode() in body
+        except urllib.error.HTTPError as e:
+            result["status"] = e.code
+            result["error"] = f"HTTP {e.code}"
+        except OSError as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+
+def summarize(results, elapsed):
+    latencies = sorted(result["seconds"] for result in results)
+    errors = sum(result["error"] is not None for result in results)
+    return {
+        "requests": len(results),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(results) / elapsed, 3) if elapsed else None,
+        "rows_per_second": round(sum(result["rows"] for result in results) / elapsed) if elapsed else None,
+        "error_rate": round(errors / len(results), 4) if results else None,
+        "errors": errors,
+        "busy": sum(result["busy"] for result in results),
+        **{f"p{percentile}_seconds": get_percentile(latencies, percentile) for percentile in PERCENTILES},
+        "max_seconds": round(latencies[-1], 4) if latencies else None,
+    }
+
+
+def get_percentile(sorted_values, percentile):
+    # Nearest rank, so a percentile is always a latency that was measured.
+    if not sorted_values:
+        return None
+    rank = max(int(-(-percentile * len(sorted_values) // 100)), 1)
+    return round(sorted_values[rank - 1], 4)
+
+
+def print_report(summary, per_size, samples):
+    print(f"{summary['requests']} requests in {summary['seconds']:.1f} s: "
+          f"{summary['requests_per_second']:.2f} requests/s, {summary['rows_per_second']:,} rows/s")
+    print(f"errors {summary['errors']} ({summary['error_rate']:.2%}), busy {summary['busy']}")
+    print(f"\n{'rows':>9} {'requests':>9} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'errors':>7}")
+    for rows, size_summary in [("all", summary)] + sorted(per_size.items()):
+        print(f"{rows:>9} {size_summary['requests']:>9} {format_seconds(size_summary['p50_seconds']):>8} "
+              f"{format_seconds(size_summary['p95_seconds']):>8} {format_seconds(size_summary['p99_seconds']):>8} "
+              f"{size_summary['errors']:>7}")
+    if samples:
+        print(f"\n{'seconds':>8} {'completed':>10} {'master MiB':>11} {'workers':>8} {'max worker MiB':>15} "
+              f"{'pools':>6} {'pools MiB':>10} {'total MiB':>10}")
+        for sample in samples:
+            workers = sample["workers"].values()
+            pools = sample["pools"].values()
+            total = sum(workers) + sum(pools) + (sample["master"] or 0)
+            print(f"{sample['seconds']:>8.1f} {sample['completed']:>10} {(sample['master'] or 0) / 2 ** 20:>11.1f} "
+                  f"{len(workers):>8} {max(workers, default=0) / 2 ** 20:>15.1f} {len(pools):>6} "
+                  f"{sum(pools) / 2 ** 20:>10.1f} {total / 2 ** 20:>10.1f}")
+
+
+def format_seconds(seconds):
+    return "-" if seconds is None else f"{seconds:.3f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Croracle upload callback under gunicorn.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="export sizes to upload")
+    parser.add_argument("--variants", type=int, default=3, help="different exports per size")
+    parser.add_argument("--concurrency", type=int, default=4, help="clients sending requests at once")
+    parser.add_argument("--duration", type=float, help="seconds to send requests for")
+    parser.add_argument("--requests", type=int, help="requests to send, 100 when no --duration is given")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers of the started server")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds a request may take")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="seconds between RSS samples")
+    parser.add_argument("--cache", action="store_true", help="keep the result cache of the started server on")
+    parser.add_argument("--url", help="test a running server instead of starting one; RSS is not sampled")
+    parser.add_argument("--output", default="loadtest_output.json")
+    args = parser.parse_args()
+    if args.duration is None and args.requests is None:
+        args.requests = 100
+
+    payloads = get_payloads(args.rows, args.variants)
+    server = None
+    state_dir = None
+    url = args.url
+    if url is None:
+        state_dir = tempfile.mkdtemp(prefix="croracle-loadtest-")
+        server, url = start_server(args.workers, int(args.timeout), args.cache, state_dir)
+    try:
+        test = LoadTest(url.rstrip("/"), get_upload_callback(url.rstrip("/")), payloads, args.concurrency,
+                        args.duration, args.requests, args.timeout)
+        elapsed, samples = test.run(server.pid if server is not None else None, args.sample_interval)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(30)
+        if state_dir is not None:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    summary = summarize(test.results, elapsed)
+    per_size = {rows: summarize([result for result in test.results if result["rows"] == rows], elapsed)
+                for rows in args.rows}
+    print_report(summary, per_size, samples)
+    with open(args.output, "w") as output:
+        json.dump({
+            "commit": get_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "summary": summary,
+            "per_size": per_size,
+            "samples": samples,
+            "errors": sorted({result["error"] for result in test.results if result["error"] is not None}),
+        }, output, indent=2)
+
+    if summary["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
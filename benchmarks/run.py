@@ -0,0 +1,224 @@
+"""Time and memory-profile the upload pipeline on synthetic CDC exports.
+
+    python -m benchmarks.run --rows 1000 100000 --output bench.json
+    python -m benchmarks.run --rows 1000 100000 --output bench.json --compare previous.json
+
+Every case is timed ``--repeat`` times, then run once more under tracemalloc for its
+peak memory. Results are written as JSON so runs from different commits can be compared.
+"""
+import argparse
+import atexit
+import base64
+import gzip
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The result cache would turn every repeated upload into a cache hit.
+os.environ["CRORACLE_RESULT_CACHE_MAX_BYTES"] = "0"
+# Keep every store, metric and admission ticket apart from those of a server running on the host.
+STATE_DIR = tempfile.mkdtemp(prefix="croracle-bench-")
+atexit.register(shutil.rmtree, STATE_DIR, ignore_errors=True)
+os.environ.update({
+    "CRORACLE_STATE_DIR": STATE_DIR,
+    "CRORACLE_DATASET_STORE_DIR": os.path.join(STATE_DIR, "datasets"),
+    "CRORACLE_HISTORY_STORE_DIR": os.path.join(STATE_DIR, "histories"),
+    "CRORACLE_RESULT_CACHE_PATH": os.path.join(STATE_DIR, "results.sqlite3"),
+    "CRORACLE_JOB_STORE_PATH": os.path.join(STATE_DIR, "jobs.sqlite3"),
+    "CRORACLE_METRICS_PATH": os.path.join(STATE_DIR, "metrics.sqlite3"),
+    "CRORACLE_ADMISSION_PATH": os.path.join(STATE_DIR, "admission.sqlite3"),
+    "CRORACLE_SLOW_UPLOAD_PROFILE_DIR": os.path.join(STATE_DIR, "profiles"),
+})
+
+import pandas as pd  # noqa: E402
+import plotly  # noqa: E402
+
+import app  # noqa: E402
+import settings  # noqa: E402
+from benchmarks import get_commit  # noqa: E402
+from benchmarks.generator import generate_export  # noqa: E402
+from services import earnings_service, graph_service, purchase_service  # noqa: E402
+from services.aggregation_service import (GRANULARITIES, aggregate, get_description_totals,  # noqa: E402
+                                          get_kind_totals)
+from services.ingest_service import load_upload  # noqa: E402
+from services.stats_service import (SECTIONS, get_cube, get_native_currency, get_stats,  # noqa: E402
+                                    prepare_transactions, render_section, render_timeline)
+from utils.constants import EARNING_KINDS, PURCHASE_KIND  # noqa: E402
+from utils.serialization import dumps  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+REGRESSION_THRESHOLD = 1.2
+
+
+def get_cases(export):
+    csv = export.to_csv(index=False).encode()
+    contents = "data:text/csv;base64," + base64.b64encode(csv).decode()
+
+    # Start from what the upload path loads, so dtypes match production.
+    loaded = load_upload(contents, "export.csv")
+    prepared = loaded.copy()
+    prepare_transactions(prepared)
+    native_currency = get_native_currency(prepared)
+    index = "benchmark"
+    aggregates = aggregate(prepared)
+    cube = get_cube(prepared)
+    purchases = prepared[prepared["Transaction Kind"] == PURCHASE_KIND]
+    earnings = prepared[prepared["Transaction Kind"].isin(EARNING_KINDS)]
+
+    # name -> (setup, function); setup runs outside the timed section and returns the arguments.
+    cases = {
+        "parse_contents": (lambda: (contents, "export.csv", None), app.parse_contents),
+        "load_upload": (lambda: (contents, "export.csv"), load_upload),
+        "get_stats": (lambda: (loaded.copy(),), get_stats),
+        "aggregate": (lambda: (prepared,), aggregate),
+        "get_cube": (lambda: (prepared,), get_cube),
+        "purchase.get_total_purchase_stats": (lambda: (aggregates, native_currency),
+                                              purchase_service.get_total_purchase_stats),
+        "purchase.get_purchase_graphs": (lambda: (aggregates, purchases, native_currency, index),
+                                         purchase_service.get_purchase_graphs),
+        "earnings.get_total_earning_stats": (lambda: (aggregates, native_currency),
+                                             earnings_service.get_total_earning_stats),
+        "earnings.get_total_earnings_breakdown": (lambda: (aggregates, native_currency),
+                                                  earnings_service.get_total_earnings_breakdown),
+        "earnings.get_earnings_graphs": (lambda: (aggregates, earnings, native_currency, index),
+                                         earnings_service.get_earnings_graphs),
+        "earnings.get_earnings_pie_chart": (lambda: (aggregates, index), earnings_service.get_earnings_pie_chart),
+        "graph.get_bar_chart": (
+            lambda: (get_description_totals(aggregates, [PURCHASE_KIND]), "Transaction Description",
+                     "Native Amount", "Purchases", "purchases", index),
+            graph_service.get_bar_chart),
+        "graph.get_scatter_plot": (
+            lambda: (earnings, "Timestamp (UTC)", "Native Amount", "Transaction Description", "Native Amount",
+                     "earnings", index),
+            graph_service.get_scatter_plot),
+        "graph.get_pie_chart": (
+            lambda: (get_kind_totals(aggregates, EARNING_KINDS), "Transaction Kind", "Native Amount",
+                     "earnings-pie", index, "Earnings"),
+            graph_service.get_pie_chart),
+    }
+    for granularity in GRANULARITIES:
+        cases[f"render_timeline.{granularity}"] = (
+            lambda granularity=granularity: ("earnings", cube, granularity, native_currency), render_timeline)
+    for section in SECTIONS:
+        cases[f"render_section.{section}"] = (lambda section=section: (section, prepared, native_currency, index),
+                                              render_section)
+    return cases
+
+
+def measure(setup, function, repeat):
+    durations = []
+    for _ in range(repeat):
+        args = setup()
+        started = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - started)
+
+    args = setup()
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"min_seconds": min(durations), "median_seconds": statistics.median(durations), "peak_bytes": peak}
+
+
+def measure_payload(setup, function):
+    """Size of a rendered section as Dash used to encode it, compacted, and compressed."""
+    decimals = settings.FIGURE_FLOAT_DECIMALS
+    settings.FIGURE_FLOAT_DECIMALS = None
+    try:
+        raw = json.dumps(function(*setup()), cls=plotly.utils.PlotlyJSONEncoder).encode()
+    finally:
+        settings.FIGURE_FLOAT_DECIMALS = decimals
+
+    compact = dumps(function(*setup()))
+    if isinstance(compact, str):
+        compact = compact.encode()
+    payload = {
+        "payload_bytes": len(raw),
+        "compact_payload_bytes": len(compact),
+        "gzip_payload_bytes": len(gzip.compress(compact, settings.COMPRESS_GZIP_LEVEL)),
+    }
+    if brotli is not None:
+        payload["brotli_payload_bytes"] = len(brotli.compress(compact, quality=settings.COMPRESS_BR_LEVEL))
+    return payload
+
+
+def run(rows_list, repeat, only=None):
+    results = []
+    for rows in rows_list:
+        cases = get_cases(generate_export(rows))
+        for name, (setup, function) in cases.items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            result = {"name": name, "rows": rows, **measure(setup, function, repeat)}
+            print(f"{name:<42} {rows:>9,} rows  {result['min_seconds'] * 1000:>10.1f} ms"
+                  f"  {result['peak_bytes'] / (1024 * 1024):>9.1f} MiB", file=sys.stderr)
+            if name.startswith("render_section."):
+                result.update(measure_payload(setup, function))
+                print(f"{'':<42} payload {result['payload_bytes']:,} -> {result['compact_payload_bytes']:,} bytes,"
+                      f" {result['gzip_payload_bytes']:,} gzipped", file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def compare(results, previous_results, threshold):
+    previous = {(result["name"], result["rows"]): result for result in previous_results}
+    regressions = []
+    for result in results:
+        before = previous.get((result["name"], result["rows"]))
+        if before is None or before["min_seconds"] <= 0:
+            continue
+        ratio = result["min_seconds"] / before["min_seconds"]
+        marker = "REGRESSION" if ratio > threshold else ""
+        print(f"{result['name']:<42} {result['rows']:>9,} rows  {ratio:>6.2f}x time"
+              f"  {result['peak_bytes'] / max(before['peak_bytes'], 1):>6.2f}x memory  {marker}", file=sys.stderr)
+        if marker:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Croracle upload pipeline.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS,
+                        help="export sizes to benchmark, e.g. 1000 100000 5000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="run only cases whose name contains one of these strings")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", help="earlier output to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.repeat, args.only)
+    with open(args.output, "w") as output:
+        json.dump({
+            "commit": get_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "results": results,
+        }, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as previous:
+            regressions = compare(results, json.load(previous)["results"], args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Report how long importing the app takes, per module.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --top 30 --budget 1.5
+
+The app is imported in a fresh interpreter with ``-X importtime``, the way a worker
+starts without preloading. Modules are listed by cumulative import time, heaviest
+first. With ``--budget``, exits with an error when the whole import takes longer.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+DEFAULT_TOP = 20
+
+
+def get_import_times(module):
+    """Self and cumulative import time in seconds of every module imported by ``module``."""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    wall_seconds = time.perf_counter() - started
+
+    times = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return times, wall_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the import time of the Croracle app per module.")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    parser.add_argument("--budget", type=float, help="seconds the import of --module may take")
+    args = parser.parse_args()
+
+    times, wall_seconds = get_import_times(args.module)
+    heaviest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    print(f"{'module':<48} {'self ms':>9} {'cumulative ms':>14}")
+    for name, (self_seconds, cumulative_seconds) in heaviest:
+        print(f"{name:<48} {self_seconds * 1000:>9.1f} {cumulative_seconds * 1000:>14.1f}")
+
+    import_seconds = times[args.module][1]
+    print(f"\nimport {args.module}: {import_seconds:.2f} s, interpreter start included: {wall_seconds:.2f} s")
+    if args.budget is not None and import_seconds > args.budget:
+        print(f"import {args.module} is over the budget of {args.budget:.2f} s", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import dash_bootstrap_components as dbc
+import dash_html_components as html
+
+from errors.messages import file_format_error
+
+
+def get_wrong_format_alert(e=None):
+    return dbc.Container(html.Div(
+        [
+            dbc.Row(
+                dbc.Col([
+                    dbc.Alert([
+                        html.H4("Wrong file format.", className="alert-heading"),
+                        html.P(e.message if e is not None else "Only CSV, Parquet and Arrow files are allowed."),
+                        html.Hr(),
+                        html.P("Please make sure that the file you are using is a CSV export, "
+                               "as it is or compressed with gzip or zip.",
+                               className="mb-0"),
+
+                    ],
+                        dismissable=True,
+                        color="danger"
+                    )
+                ],
+                    width={"size": 6, "offset": 3}
+                ))
+        ]
+    )
+    )
+
+
+def get_file_too_large_alert(e):
+    return dbc.Container(html.Div(
+        [
+            dbc.Row(
+                dbc.Col([
+                    dbc.Alert([
+                        html.H4("File too large.", className="alert-heading"),
+                        html.P(e.message, className="mb-0"),
+                    ],
+                        dismissable=True,
+                        color="danger"
+                    )
+                ],
+                    width={"size": 6, "offset": 3}
+                ))
+        ]
+    )
+    )
+
+
+def get_server_busy_alert():
+    return dbc.Container(html.Div(
+        [
+            dbc.Row(
+                dbc.Col([
+                    dbc.Alert([
+                        html.H4("The server is busy.", className="alert-heading"),
+                        html.P("Too many large files are being processed right now."),
+                        html.Hr(),
+                        html.P("Please upload your file again in a minute.", className="mb-0"),
+                    ],
+                        dismissable=True,
+                        color="warning"
+                    )
+                ],
+                    width={"size": 6, "offset": 3}
+                ))
+        ]
+    )
+    )
+
+
+def get_no_transactions_alert():
+    return dbc.Container(html.Div(
+        [
+            dbc.Row(
+                dbc.Col([
+                    dbc.Alert([
+                        html.H4("No transactions found.", className="alert-heading"),
+                        html.P("The files you uploaded hold no transactions."),
+                        html.Hr(),
+                        html.P("Please make sure that the export is not empty.", className="mb-0"),
+                    ],
+                        dismissable=True,
+                        color="info"
+                    )
+                ],
+                    width={"size": 6, "offset": 3}
+                ))
+        ]
+    )
+    )
+
+
+def get_unexpected_error_alert(e):
+    return dbc.Container(html.Div(
+        [
+            dbc.Row(dbc.Alert([
+                html.H4("An error has occured", className="alert-heading"),
+                html.P("There is no descriptive info for this eror"),
+                html.Hr(),
+                html.P("Please contact us and mention the below:", className="mb-0"),
+                html.P(f"Error message: {str(e)}"),
+                html.P(f"Error class: {type(e)}")
+            ],
+                dismissable=True,
+                color="danger")
+            )
+        ]
+    )
+    )
+
+
+def get_processing_error_alert(e):
+    return dbc.Container(html.Div(
+        [
+            dbc.Row(dbc.Alert([
+                html.H4("There was an error processing the file", className="alert-heading"),
+                html.P(file_format_error),
+                html.Hr(),
+                html.P("If everything of those are ok please contact us and mention the below:", className="mb-0"),
+                html.P(f"Error message: {str(e)}"),
+                html.P(f"Error class: {type(e)}")
+            ],
+                dismissable=True,
+                color="danger")
+            )
+        ]
+    ))
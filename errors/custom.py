@@ -9,3 +9,30 @@ class FileMissingColumn(Exception):
     def __init__(self, message="Missing required columns from given file."):
         self.message = message
         super().__init__(self.message)
+
+
+class InvalidFileFormat(Exception):
+    """Exception raised when an upload is neither delimited text nor a supported binary format."""
+
+    def __init__(self, message="The given file is not a CSV, Parquet or Arrow file."):
+        self.message = message
+        super().__init__(self.message)
+
+
+class FileTooLarge(Exception):
+    """Exception raised when an upload is larger than the configured maximum."""
+
+    def __init__(self, size, max_size):
+        self.size = size
+        self.max_size = max_size
+        self.message = (f"The given file is {size / (1024 * 1024):.1f} MB, "
+                        f"the maximum is {max_size / (1024 * 1024):.1f} MB.")
+        super().__init__(self.message)
+
+
+class ServerBusy(Exception):
+    """Exception raised when an upload could not be admitted for processing in time."""
+
+    def __init__(self, message="The server is busy processing other uploads."):
+        self.message = message
+        super().__init__(self.message)
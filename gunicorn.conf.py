@@ -0,0 +1,23 @@
+"""Gunicorn settings, used by the Procfile: ``gunicorn -c gunicorn.conf.py app:server``.
+
+Workers and the port come from gunicorn's own ``WEB_CONCURRENCY`` and ``PORT`` variables.
+"""
+import gc
+import importlib
+
+import settings
+
+preload_app = settings.PRELOAD_APP
+threads = settings.WEB_THREADS
+
+
+def when_ready(server):
+    if not settings.PRELOAD_APP:
+        return
+    for module in settings.PRELOAD_MODULES:
+        importlib.import_module(module)
+    # Objects that exist now are never collected; without this the collector writes to their
+    # headers in every worker and the pages shared with the master get copied one by one.
+    gc.freeze()
+    server.log.info("Preloaded %s, %d objects shared with the workers", ", ".join(settings.PRELOAD_MODULES),
+                    gc.get_freeze_count())
@@ -0,0 +1,94 @@
+import pandas as pd
+
+from utils.constants import AMOUNT_COLUMNS
+
+GROUP_COLUMNS = ["Transaction Kind", "Transaction Description", "YearMonth"]
+
+GRANULARITIES = ["day", "week", "month", "year"]
+
+
+def aggregate(data):
+    """Compute every total the dashboard shows in a single grouped pass over ``data``.
+
+    The rows are reduced once to (kind, description, month) sums. Per-kind totals,
+    per-description totals and monthly series are rolled up from that small frame,
+    so no further pass over the raw rows is needed.
+    """
+    return roll_up(reduce_transactions(data))
+
+
+def reduce_transactions(data):
+    by_description_month = data.groupby(GROUP_COLUMNS, observed=True, dropna=False)[AMOUNT_COLUMNS].sum()
+    # The reduced frame is small, so its categorical labels are turned into plain ones. That
+    # keeps the roll-ups below and every lookup by label free of unobserved categories.
+    by_description_month.index = by_description_month.index.set_levels(
+        [level.astype(object) if isinstance(level, pd.CategoricalIndex) else level
+         for level in by_description_month.index.levels])
+    return by_description_month
+
+
+def merge_reduced(reduced, other):
+    """Add the (kind, description, month) sums of ``other`` to those of ``reduced``.
+
+    Only the groups present in either frame are touched, so merging the sums of newly
+    appended rows into a stored history costs as much as the new groups, not the history.
+    """
+    if reduced is None:
+        return other
+    return pd.concat([reduced, other]).groupby(level=GROUP_COLUMNS, dropna=False).sum()
+
+
+def roll_up(by_description_month):
+    return {
+        "kinds": by_description_month.groupby(level="Transaction Kind").sum(),
+        "descriptions": by_description_month.groupby(
+            level=["Transaction Kind", "Transaction Description"], dropna=False).sum(),
+        "monthly": by_description_month.groupby(level=["Transaction Kind", "YearMonth"]).sum(),
+    }
+
+
+def build_cube(data):
+    """(kind, description, period) sums of ``data`` at every granularity in ``GRANULARITIES``.
+
+    The rows are reduced once to daily sums; weeks, months and years are rolled up from
+    those, so switching the granularity of a chart is a lookup in the returned dict.
+    """
+    daily = data.groupby(["Transaction Kind", "Transaction Description", "Timestamp (UTC)"], observed=True,
+                         dropna=False)[AMOUNT_COLUMNS].sum()
+    daily.index = daily.index.set_levels(
+        [level.astype(object) if isinstance(level, pd.CategoricalIndex) else level for level in daily.index.levels])
+    daily.index = daily.index.set_names("Period", level="Timestamp (UTC)")
+
+    days = daily.index.get_level_values("Period")
+    # Weeks start on Monday, as in ISO weeks.
+    periods = {
+        "week": days - pd.to_timedelta(days.dayofweek, unit="D"),
+        "month": days.values.astype("datetime64[M]").astype("datetime64[ns]"),
+        "year": days.values.astype("datetime64[Y]").astype("datetime64[ns]"),
+    }
+    cube = {"day": daily}
+    for granularity, period in periods.items():
+        cube[granularity] = daily.groupby([daily.index.get_level_values("Transaction Kind"),
+                                           daily.index.get_level_values("Transaction Description"),
+                                           pd.Index(period, name="Period")], dropna=False).sum()
+    return cube
+
+
+def get_period_totals(cube, granularity, kinds):
+    totals = cube[granularity]
+    totals = totals[totals.index.get_level_values("Transaction Kind").isin(kinds)]
+    return totals.groupby(level="Period").sum().sort_index().reset_index()
+
+
+def get_totals(aggregates, kinds):
+    totals = aggregates["kinds"].reindex(kinds).sum()
+    return round(float(totals["Native Amount"]), 2), round(float(totals["Native Amount (in USD)"]), 2)
+
+
+def get_kind_totals(aggregates, kinds):
+    return aggregates["kinds"].reindex(kinds).dropna().reset_index()
+
+
+def get_description_totals(aggregates, kinds):
+    descriptions = aggregates["descriptions"]
+    return descriptions[descriptions.index.get_level_values("Transaction Kind").isin(kinds)].reset_index()
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+from utils.constants import TRANSFER_KINDS
+
+# Holdings at or below this many units count as sold out; crypto amounts carry 8 decimals.
+HOLDINGS_EPSILON = 1e-9
+# The running products of the average-cost basis are restarted before their inverse, about
+# exp(BASIS_LOG_BLOCK), gets anywhere near the float64 limit of exp(709).
+BASIS_LOG_BLOCK = 300.0
+
+
+def get_transaction_legs(data, native_currency):
+    """Split transactions into per-asset quantity changes, sorted by asset and exact time.
+
+    Every row moves ``Amount`` of ``Currency`` and, for exchanges, ``To Amount`` of
+    ``To Currency``; both legs are valued at the row's native amount. Legs in the native
+    currency are cash, not holdings, and are left out.
+    """
+    value = data["Native Amount"].abs().to_numpy()
+    is_transfer = data["Transaction Kind"].isin(TRANSFER_KINDS).to_numpy()
+    timestamp = get_exact_timestamps(data).to_numpy("datetime64[ns]")
+    # Exports list the newest transactions first, so at equal times later rows happened earlier.
+    # Row positions only break ties: merged files and history parts follow each other in any order.
+    position = -np.arange(len(data))
+
+    assets = pd.api.types.union_categoricals(
+        [pd.Categorical(data["Currency"]), pd.Categorical(data["To Currency"])], ignore_order=True)
+    legs = pd.DataFrame({
+        "asset": assets,
+        "quantity": np.concatenate([data["Amount"].to_numpy("float64"), data["To Amount"].to_numpy("float64")]),
+        "value": np.concatenate([value, value]),
+        "is_transfer": np.concatenate([is_transfer, is_transfer]),
+        "timestamp": np.concatenate([timestamp, timestamp]),
+        "position": np.concatenate([position, position]),
+    })
+    legs = legs[legs["asset"].notna() & (legs["asset"] != native_currency) & legs["quantity"].fillna(0).ne(0)]
+
+    codes = legs["asset"].cat.codes.to_numpy()
+    order = np.lexsort((legs["position"].to_numpy(), legs["timestamp"].to_numpy(), codes))
+    return legs.iloc[order].reset_index(drop=True)
+
+
+def get_exact_timestamps(data):
+    if "Exact Timestamp (UTC)" not in data:
+        return data["Timestamp (UTC)"]
+    # History parts stored before the exact time was kept only have the day.
+    return data["Exact Timestamp (UTC)"].fillna(data["Timestamp (UTC)"])
+
+
+def get_cost_basis(legs):
+    """Add running holdings and average-cost and FIFO cost basis to ``legs``.
+
+    Everything is computed with grouped cumulative sums, no Python loop runs per row.
+    Holdings are assumed to start from zero at the first transaction of the export.
+    """
+    groups = legs["asset"].cat.codes.to_numpy()
+    quantity = legs["quantity"].to_numpy()
+    value = legs["value"].to_numpy()
+    is_buy = quantity > 0
+
+    # Units sold beyond what was bought came from before the export and are ignored, which
+    # keeps holdings at zero or above: the shortfall so far is the running minimum below zero.
+    net_quantity = group_cumsum(quantity, groups)
+    holdings = net_quantity - np.minimum(group_cummin(net_quantity, groups), 0.0)
+    previous_holdings = group_shift(holdings, groups)
+    bought_value = np.where(is_buy, value, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(is_buy, 1.0, np.where(previous_holdings > HOLDINGS_EPSILON,
+                                               holdings / previous_holdings, 0.0))
+    average_basis = get_average_basis(groups, ratio, bought_value)
+
+    # FIFO: the first units bought are the first sold, so the basis left is what was bought
+    # minus the cost of the first ``sold`` units, read off the cumulative buy curve.
+    bought = group_cumsum(np.where(is_buy, quantity, 0.0), groups)
+    sold = np.clip(bought - holdings, 0.0, bought)
+    bought_cost = group_cumsum(bought_value, groups)
+    fifo_basis = bought_cost - get_fifo_cost(groups, is_buy, bought, bought_cost, sold)
+
+    # Transfers move units in and out of the account without selling them, so they realize nothing.
+    is_sale = ~is_buy & ~legs["is_transfer"].to_numpy()
+    average_realized = value - (group_shift(average_basis, groups) - average_basis)
+    fifo_realized = value - (group_shift(fifo_basis, groups) - fifo_basis)
+    return legs.assign(
+        holdings=holdings,
+        average_basis=average_basis,
+        fifo_basis=fifo_basis,
+        average_realized=np.where(is_sale, average_realized, 0.0),
+        fifo_realized=np.where(is_sale, fifo_realized, 0.0),
+    )
+
+
+def get_average_basis(groups, ratio, bought_value):
+    """Average-cost basis after every leg: a buy adds its value, a sale keeps the share of units left.
+
+    basis = ratio * previous basis + bought value is solved with a running product of the
+    ratios, restarted whenever an asset is sold out. Many partial sales drive that product
+    towards zero and its inverse past the float range, so the product is also restarted,
+    in blocks, every time it falls by another ``exp(-BASIS_LOG_BLOCK)``; the basis at the
+    end of a block is carried into the next one by a loop over those restarts only.
+    """
+    sold_out = ratio <= HOLDINGS_EPSILON
+    starts = sold_out | np.r_[True, groups[1:] != groups[:-1]]
+    log_product = group_cumsum(np.log(np.where(sold_out, 1.0, ratio)), np.cumsum(starts))
+
+    level = np.floor(-log_product / BASIS_LOG_BLOCK)
+    block_starts = starts | np.r_[True, level[1:] != level[:-1]]
+    blocks = np.cumsum(block_starts)
+    continued = block_starts & ~starts
+    # The running product since the start of the block stays above exp(-BASIS_LOG_BLOCK) times one ratio.
+    log_base = np.where(continued, np.r_[0.0, log_product[:-1]], 0.0)[block_starts]
+    product = np.exp(log_product - log_base[blocks - 1])
+    block_basis = product * group_cumsum(bought_value / product, blocks)
+
+    carried = np.zeros(len(blocks) + 1)
+    for start in np.flatnonzero(continued):
+        carried[blocks[start]] = block_basis[start - 1] + carried[blocks[start - 1]] * product[start - 1]
+    return block_basis + carried[blocks] * product
+
+
+def get_fifo_cost(groups, is_buy, bought, bought_cost, sold):
+    """Cost of the first ``sold`` units of every leg's asset, by interpolating its buy curve.
+
+    The buy curves of all assets are laid side by side on one axis, asset ``g`` spanning
+    ``[g, g + 0.5]`` with its quantities scaled by its total, so one ``np.interp`` serves all.
+    """
+    total_bought = pd.Series(bought).groupby(groups).transform("max").to_numpy()
+    scale = np.where(total_bought > 0, 0.5 / np.where(total_bought > 0, total_bought, 1), 0.0)
+    unique_groups = np.unique(groups)
+    curve_x = np.concatenate([unique_groups, (groups + bought * scale)[is_buy]])
+    curve_y = np.concatenate([np.zeros(len(unique_groups)), bought_cost[is_buy]])
+    curve_order = np.argsort(curve_x, kind="stable")
+    return np.interp(groups + sold * scale, curve_x[curve_order], curve_y[curve_order])
+
+
+def get_holdings(data, native_currency):
+    """Per-asset holdings, cost basis and profit, as of the last transaction in ``data``.
+
+    Unrealized profit values holdings at the last price seen for each asset in the export.
+    """
+    legs = get_transaction_legs(data, native_currency)
+    # Filters that match no crypto transaction leave nothing to build the buy curves from.
+    if legs.empty:
+        return legs, pd.DataFrame()
+    legs = get_cost_basis(legs)
+
+    legs["price"] = legs["value"] / legs["quantity"].abs()
+    summary = legs.groupby("asset", observed=True).agg(
+        holdings=("holdings", "last"),
+        average_basis=("average_basis", "last"),
+        fifo_basis=("fifo_basis", "last"),
+        price=("price", "last"),
+        average_realized=("average_realized", "sum"),
+        fifo_realized=("fifo_realized", "sum"),
+    )
+    summary["holdings"] = summary["holdings"].where(summary["holdings"] > HOLDINGS_EPSILON, 0.0)
+    summary["average_cost"] = summary["average_basis"] / summary["holdings"].where(summary["holdings"] > 0)
+    summary["market_value"] = summary["holdings"] * summary["price"]
+    summary["average_unrealized"] = summary["market_value"] - summary["average_basis"]
+    summary["fifo_unrealized"] = summary["market_value"] - summary["fifo_basis"]
+    summary.index = summary.index.astype(object)
+    return legs, summary.sort_values("market_value", ascending=False)
+
+
+def get_monthly_basis(legs):
+    """Average-cost basis of every asset at the end of each month, carried over months without transactions."""
+    months = legs["timestamp"].to_numpy().astype("datetime64[M]").astype("datetime64[ns]")
+    monthly = legs.assign(YearMonth=months).groupby(["YearMonth", "asset"], observed=True)["average_basis"].last()
+    return monthly.unstack("asset").ffill().fillna(0.0)
+
+
+def group_cumsum(values, groups):
+    return pd.Series(values).groupby(groups).cumsum().to_numpy()
+
+
+def group_cummin(values, groups):
+    return pd.Series(values).groupby(groups).cummin().to_numpy()
+
+
+def group_shift(values, groups):
+    return pd.Series(values).groupby(groups).shift(fill_value=0.0).to_numpy()
@@ -1,80 +1,145 @@
 import dash_core_components as dcc
-import plotly.express as px
 import plotly.graph_objs as go
 
+import settings
+from utils.downsampling import downsample
+from utils.metrics import observed_figure
+from utils.serialization import compact_values
 
-def get_timeline_chart(df, x_axis_data, y_axis_data, timeline_name, native_currency):
-    return dcc.Graph(
-        id="purchases-timeline",
-        figure={
-            "data": [
-                dict(
-                    x=df[x_axis_data],
-                    y=df[y_axis_data],
-                    name=timeline_name,
-                    marker=dict(color="rgb(177, 35, 5)"),
-                ),
-            ],
-            "layout": {
-                "title": f"{timeline_name.title()} Timeline ({native_currency})",
-                "annotations": "annotations",
-                "legend": {"x": 0, "y": 1.0},
-            },
+# Figures carry the USD values of their native amounts in ``meta``, so assets/currency.js
+# switches them between currencies in the browser.
+USD_COLUMNS = {"Native Amount": "Native Amount (in USD)"}
+
+
+def get_timeline_figure(df, x_axis_data, y_axis_data, timeline_name, native_currency):
+    return {
+        "data": [
+            dict(
+                x=df[x_axis_data],
+                y=compact_values(df[y_axis_data], settings.FIGURE_FLOAT_DECIMALS),
+                name=timeline_name,
+                marker=dict(color="rgb(177, 35, 5)"),
+                meta=get_usd_meta(df, y_axis_data),
+            ),
+        ],
+        "layout": {
+            "title": f"{timeline_name.title()} Timeline ({native_currency})",
+            "annotations": "annotations",
+            "legend": {"x": 0, "y": 1.0},
+            "xaxis": {"rangeslider": {"visible": True}},
+            "meta": get_title_meta(f"{timeline_name.title()} Timeline ({{currency}})", native_currency),
         },
-    )
+    }
 
 
-def get_bar_chart(df, x_axis_data, y_axis_data, title, name):
+@observed_figure("figure_bar")
+def get_bar_chart(df, x_axis_data, y_axis_data, title, name, index, native_currency=None):
+    """``title`` may name the currency shown as ``{currency}``, ``index`` is the one of the dashboard."""
     return dcc.Graph(
-        id=f"{name}-graph",
+        id={"type": "currency-graph", "index": index, "name": f"{name}-graph"},
         figure={
             "data": [
                 {
                     "x": df[x_axis_data],
-                    "y": df[y_axis_data],
+                    "y": compact_values(df[y_axis_data], settings.FIGURE_FLOAT_DECIMALS),
                     "type": "bar",
+                    "meta": get_usd_meta(df, y_axis_data),
                 },
             ],
             "layout": {
-                "title": title,
+                "title": title.format(currency=native_currency),
                 "annotations": "annotations",
+                "meta": get_title_meta(title, native_currency),
             },
         },
     ),
 
 
-def get_scatter_plot(df, x_axis_data, y_axis_data, color, size, name):
+@observed_figure("figure_scatter")
+def get_scatter_plot(df, x_axis_data, y_axis_data, color, size, name, index):
     return dcc.Graph(
         className="row-content",
-        id=f"{name}-timeline-type",
+        id={"type": "currency-graph", "index": index, "name": f"{name}-timeline-type"},
         figure=get_scatter_plot_image(df, x_axis_data, y_axis_data, color, size)
     ),
 
 
 def get_scatter_plot_image(df, x_axis_data, y_axis_data, color, size):
+    # plotly.express takes a tenth of a second to import, so workers only pay for it on the first scatter plot.
+    import plotly.express as px
+
     if df.empty:
         return px.scatter()
-    else:
-        return px.scatter(data_frame=df,
-                          x=df[x_axis_data],
-                          y=df[y_axis_data],
-                          color=df[color],
-                          size=df[size], )
 
+    row_count = len(df)
+    df = downsample(df, x_axis_data, y_axis_data, color, settings.SCATTER_POINT_BUDGET)
+    figure = px.scatter(data_frame=df,
+                        x=df[x_axis_data],
+                        y=compact_values(df[y_axis_data], settings.FIGURE_FLOAT_DECIMALS),
+                        color=df[color],
+                        size=compact_values(df[size], settings.FIGURE_FLOAT_DECIMALS),
+                        render_mode="webgl" if row_count > settings.SCATTER_WEBGL_THRESHOLD else "svg", )
+
+    # The x axis follows the range selected on the timeline, see assets/currency.js.
+    figure.update_layout(meta={"follows_timeline": True})
+    for trace in figure.data:
+        trace.meta = get_usd_meta(df[df[color] == trace.name], y_axis_data)
 
-def get_pie_chart(df, labels, values, name, title):
+    if len(df) < row_count:
+        figure.add_annotation(text=f"Showing {len(df):,} of {row_count:,} transactions",
+                              xref="paper", yref="paper", x=1, y=1.05, showarrow=False)
+    return figure
+
+
+@observed_figure("figure_pie")
+def get_pie_chart(df, labels, values, name, index, title):
     return dcc.Graph(
         className="row-content",
-        id=f"{name}-graph",
+        id={"type": "currency-graph", "index": index, "name": f"{name}-graph"},
         style={"display": "inline-block", "width": "100%"},
         figure=go.Figure(
             data=[
                 go.Pie(
                     labels=df[labels],
-                    values=df[values],
-                    hole=.3
+                    values=compact_values(df[values], settings.FIGURE_FLOAT_DECIMALS),
+                    hole=.3,
+                    meta=get_usd_meta(df, values),
                 )
             ],
             layout=go.Layout(title=title),
         ),
-    ),
\ No newline at end of file
+    ),
+
+
+@observed_figure("figure_lines")
+def get_line_chart(df, title, name, index):
+    """One line per column of ``df``, plotted against its index."""
+    return dcc.Graph(
+        className="row-content",
+        id={"type": "graph", "index": index, "name": f"{name}-graph"},
+        figure={
+            "data": [
+                {
+                    "x": df.index,
+                    "y": compact_values(df[column], settings.FIGURE_FLOAT_DECIMALS),
+                    "name": str(column),
+                    "type": "scatter",
+                    "mode": "lines",
+                }
+                for column in df.columns
+            ],
+            "layout": {
+                "title": title,
+            },
+        },
+    )
+
+
+def get_usd_meta(df, column):
+    if USD_COLUMNS.get(column) not in df.columns:
+        return None
+    return {"usd": compact_values(df[USD_COLUMNS[column]], settings.FIGURE_FLOAT_DECIMALS)}
+
+
+def get_title_meta(title, native_currency):
+    return {"titles": {"native": title.format(currency=native_currency), "usd": title.format(currency="USD")}}
@@ -0,0 +1,114 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from services.aggregation_service import reduce_transactions, merge_reduced, roll_up
+from services.ingest_service import concat_transactions
+from services.stats_service import (validate_columns, prepare_transactions, get_native_currency, get_filter_options,
+                                    merge_filter_options, render_aggregate_totals)
+from utils.history import is_history_id
+from utils.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+# A transaction is the same one in two exports when these match.
+ROW_KEY_COLUMNS = ["Timestamp (UTC)", "Transaction Description", "Amount", "Transaction Kind"]
+
+HISTORY_KEY_PREFIX = "history:"
+
+
+def append_transactions(store, history_id, data):
+    """Append the rows of ``data`` that are not in the history yet and update its totals.
+
+    Row keys are hashed from the raw columns, so the history itself is only read as a
+    sorted array of keys. Timestamps are parsed and sums computed for the new rows alone,
+    and their (kind, description, month) sums are added to the stored ones.
+    Returns the new state of the history and the number of rows added.
+    """
+    validate_columns(data)
+    with observe_stage("deduplicate", len(data)):
+        keys = get_row_keys(data)
+        is_unique = ~pd.Series(keys).duplicated().to_numpy()
+
+    with store.lock(history_id):
+        state = store.get_state(history_id) or {
+            "revision": 0,
+            "rows": 0,
+            "keys": np.empty(0, dtype=np.uint64),
+            "native_currency": None,
+            "reduced": None,
+            "filters": None,
+        }
+        is_new = is_unique & ~contains_keys(state["keys"], keys)
+        added = int(is_new.sum())
+        if not added:
+            return state, 0
+
+        new_data = data[is_new].reset_index(drop=True)
+        prepare_transactions(new_data)
+        with observe_stage("aggregate", added):
+            reduced = merge_reduced(state["reduced"], reduce_transactions(new_data))
+
+        state = {
+            "revision": state["revision"] + 1,
+            "rows": state["rows"] + added,
+            "keys": insert_keys(state["keys"], keys[is_new]),
+            "native_currency": state["native_currency"] or get_native_currency(new_data),
+            "reduced": reduced,
+            "filters": merge_filter_options(state["filters"], get_filter_options(new_data)),
+        }
+        store.append(history_id, state, new_data)
+
+    logger.info("Appended %d of %d rows to history %s", added, len(data), history_id)
+    return state, added
+
+
+def get_history_stats(state):
+    """Dashboard totals of a history, or None while no transaction has been appended to it."""
+    if state["reduced"] is None:
+        return None
+    stats = render_aggregate_totals(roll_up(state["reduced"]), state["native_currency"])
+    stats["native_currency"] = state["native_currency"]
+    stats["filters"] = state["filters"]
+    return stats
+
+
+def load_history(store, history_id, revision, columns=None):
+    frames = store.load(history_id, revision, columns)
+    if frames is None:
+        return None
+    return concat_transactions(frames)
+
+
+def get_row_keys(data):
+    return pd.util.hash_pandas_object(data[ROW_KEY_COLUMNS], index=False).to_numpy()
+
+
+def contains_keys(sorted_keys, keys):
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.searchsorted(sorted_keys, keys).clip(max=len(sorted_keys) - 1)
+    return sorted_keys[positions] == keys
+
+
+def insert_keys(sorted_keys, keys):
+    keys = np.sort(keys)
+    return np.insert(sorted_keys, np.searchsorted(sorted_keys, keys), keys)
+
+
+def history_dataset_key(history_id, revision):
+    return f"{HISTORY_KEY_PREFIX}{history_id}:{revision}"
+
+
+def parse_history_dataset_key(dataset_key):
+    """History id and revision of a dataset key made by ``history_dataset_key``, or None for other keys.
+
+    Keys come from the browser; a malformed history key gives None as well, and loads as expired.
+    """
+    if not isinstance(dataset_key, str) or not dataset_key.startswith(HISTORY_KEY_PREFIX):
+        return None
+    history_id, _, revision = dataset_key[len(HISTORY_KEY_PREFIX):].partition(":")
+    if not is_history_id(history_id) or not revision.isdecimal() or int(revision) < 1:
+        return None
+    return history_id, int(revision)
@@ -0,0 +1,71 @@
+import dash_bootstrap_components as dbc
+import dash_html_components as html
+import pandas as pd
+
+from services.cost_basis_service import get_holdings, get_monthly_basis
+from services.graph_service import get_line_chart
+
+# (summary column, table header, decimals)
+HOLDINGS_TABLE_COLUMNS = [
+    ("holdings", "Holdings", 8),
+    ("price", "Last price", 2),
+    ("market_value", "Value", 2),
+    ("average_cost", "Average cost", 2),
+    ("average_basis", "Cost basis (average)", 2),
+    ("average_unrealized", "Unrealized P/L (average)", 2),
+    ("average_realized", "Realized P/L (average)", 2),
+    ("fifo_basis", "Cost basis (FIFO)", 2),
+    ("fifo_unrealized", "Unrealized P/L (FIFO)", 2),
+    ("fifo_realized", "Realized P/L (FIFO)", 2),
+]
+
+
+def get_holdings_section(data, native_currency, index):
+    legs, summary = get_holdings(data, native_currency)
+    if summary.empty:
+        return {"holdings_table": get_no_holdings_alert(), "holdings_graphs": None}
+
+    return {
+        "holdings_table": get_holdings_table(summary, native_currency),
+        "holdings_graphs": get_line_chart(get_monthly_basis(legs), f"Cost Basis ({native_currency})",
+                                          "holdings-basis", index),
+    }
+
+
+def get_holdings_table(summary, native_currency):
+    header = html.Thead(html.Tr(
+        [html.Th("Asset")] + [html.Th(title) for _, title, _ in HOLDINGS_TABLE_COLUMNS]))
+    body = html.Tbody([
+        html.Tr([html.Td(asset)] + [html.Td(format_amount(row[column], decimals))
+                                    for column, _, decimals in HOLDINGS_TABLE_COLUMNS])
+        for asset, row in summary.iterrows()
+    ])
+    return html.Div(
+        [
+            dbc.Table([header, body], bordered=False, hover=True, responsive=True, size="sm"),
+            html.P(f"Amounts in {native_currency}. Holdings are valued at the last price in the export.",
+                   className="total-info-label"),
+        ],
+        className="data-table",
+    )
+
+
+def format_amount(value, decimals):
+    return "-" if pd.isna(value) else f"{value:,.{decimals}f}"
+
+
+def get_no_holdings_alert():
+    return html.Div([
+        dbc.Row(
+            dbc.Col(
+                dbc.Alert(
+                    [
+                        html.H4("No holdings found.", className="alert-heading"),
+                        html.P("Seems that there are not any crypto amounts in the file you uploaded."),
+                    ],
+                    color="info"
+                ),
+                width={"size": 6, "offset": 3},
+            )
+        )
+    ])
@@ -0,0 +1,397 @@
+import base64
+import codecs
+import contextlib
+import csv
+import gzip
+import importlib.util
+import io
+import logging
+import os
+import struct
+import tempfile
+import threading
+import tracemalloc
+import zipfile
+import zlib
+
+import pandas as pd
+
+import settings
+from errors.custom import FileMissingColumn, FileTooLarge, InvalidFileFormat
+from utils.constants import NEEDED_DF_COLUMNS, TRANSACTION_DTYPES, CATEGORY_COLUMNS
+from utils.jobs import no_progress
+from utils.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+# Ingests tracking their memory in this process, see track_peak_memory.
+_tracking_lock = threading.Lock()
+_tracked_ingests = 0
+_started_tracing = False
+
+
+def _reset_tracking_after_fork():
+    # The ingests tracked by other threads of the parent do not run in a forked child.
+    global _tracking_lock, _tracked_ingests, _started_tracing
+    _tracking_lock = threading.Lock()
+    if _tracked_ingests and _started_tracing:
+        tracemalloc.stop()
+    _tracked_ingests = 0
+    _started_tracing = False
+
+
+os.register_at_fork(after_in_child=_reset_tracking_after_fork)
+
+# Must stay a multiple of 4 so that every chunk holds whole base64 quanta.
+DECODE_CHUNK_SIZE = 4 * 256 * 1024
+# Raw bytes read from a stream at a time.
+STREAM_CHUNK_SIZE = 1024 * 1024
+# Bytes of the head of a file checked by the preflight; a multiple of 3, so its base64 is whole quanta.
+PREFLIGHT_SIZE = 6 * 1024
+
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+DELIMITERS = ",;\t|"
+
+# Leading bytes of the formats accepted besides plain CSV. Arrow streams start with the
+# continuation marker that pyarrow writes since 0.15.
+ARROW_FILE_MAGIC = b"ARROW1"
+FILE_SIGNATURES = [
+    (b"\x1f\x8b", "gzip"),
+    (b"PK\x03\x04", "zip"),
+    (b"PAR1", "parquet"),
+    (ARROW_FILE_MAGIC, "arrow"),
+    (b"\xff\xff\xff\xff", "arrow"),
+]
+COMPRESSIONS = ["gzip", "zip"]
+COLUMNAR_FORMATS = ["parquet", "arrow"]
+
+ZIP_LOCAL_HEADER = struct.Struct("<4s5H3I2H")
+# Zip members whose head can be decompressed by the preflight: stored and deflated.
+ZIP_DECOMPRESSORS = {
+    zipfile.ZIP_STORED: lambda: None,
+    zipfile.ZIP_DEFLATED: lambda: zlib.decompressobj(-zlib.MAX_WBITS),
+}
+
+
+def preflight_upload(contents):
+    """Check a ``dcc.Upload`` data URL from its size and first few KB, before anything else is decoded."""
+    offset = contents.index(",") + 1
+    head = base64.b64decode(contents[offset:offset + PREFLIGHT_SIZE // 3 * 4])
+    return preflight(head, get_decoded_size(contents, offset))
+
+
+def preflight_file(path):
+    with open(path, "rb") as file:
+        head = file.read(PREFLIGHT_SIZE)
+    return preflight(head, os.path.getsize(path))
+
+
+def preflight(head, size):
+    """Check a file from its size and the bytes of its head.
+
+    Returns the format of the file, sniffed from its leading bytes, as keyword arguments
+    of ``read_transactions``. Raises ``FileTooLarge``, ``InvalidFileFormat`` when the head
+    is neither delimited text nor a supported binary format, or ``FileMissingColumn`` when
+    the header of a CSV lacks any of ``NEEDED_DF_COLUMNS``. Parquet and Arrow files keep
+    their schema in the footer, their columns are checked once they are read.
+    """
+    if size > settings.INGEST_MAX_UPLOAD_BYTES:
+        raise FileTooLarge(size, settings.INGEST_MAX_UPLOAD_BYTES)
+
+    file_format = sniff_format(head)
+    if file_format in COLUMNAR_FORMATS:
+        if importlib.util.find_spec("pyarrow") is None:
+            raise InvalidFileFormat(f"{file_format.title()} files can not be read, pyarrow is not installed.")
+        return {"file_format": file_format}
+
+    compression = file_format if file_format in COMPRESSIONS else None
+    if compression is not None:
+        head = decompress_head(head, compression)
+    return {"file_format": "csv", "compression": compression, **preflight_text(head)}
+
+
+def preflight_text(head):
+    encoding = sniff_encoding(head)
+    try:
+        # Not final: the head may end in the middle of a multi-byte character.
+        text = codecs.getincrementaldecoder(encoding)().decode(head, final=False)
+    except UnicodeDecodeError:
+        raise InvalidFileFormat()
+    if "\x00" in text:
+        raise InvalidFileFormat()
+
+    header = text.splitlines()[0] if text.strip() else ""
+    delimiter = sniff_delimiter(header)
+    columns = next(csv.reader([header], delimiter=delimiter), [])
+    missing_columns = [column for column in NEEDED_DF_COLUMNS if column not in columns]
+    if missing_columns:
+        raise FileMissingColumn(f"Missing required columns from given file: {', '.join(missing_columns)}.")
+    return {"encoding": encoding, "delimiter": delimiter}
+
+
+def sniff_format(head):
+    for signature, file_format in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return file_format
+    return "csv"
+
+
+def decompress_head(head, compression):
+    """The leading bytes of the CSV inside a compressed head, as far as they can be decompressed."""
+    if compression == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    else:
+        if len(head) < ZIP_LOCAL_HEADER.size:
+            raise InvalidFileFormat()
+        _, _, _, method, _, _, _, _, _, name_length, extra_length = ZIP_LOCAL_HEADER.unpack_from(head)
+        if method not in ZIP_DECOMPRESSORS:
+            raise InvalidFileFormat("Zip files must be stored or compressed with deflate.")
+        head = head[ZIP_LOCAL_HEADER.size + name_length + extra_length:]
+        decompressor = ZIP_DECOMPRESSORS[method]()
+        if decompressor is None:
+            return head
+    try:
+        return decompressor.decompress(head)
+    except zlib.error:
+        raise InvalidFileFormat()
+
+
+def get_upload_size(contents):
+    return get_decoded_size(contents, contents.index(",") + 1)
+
+
+def get_decoded_size(contents, offset):
+    padding = len(contents) - len(contents.rstrip("="))
+    return (len(contents) - offset) * 3 // 4 - padding
+
+
+def sniff_encoding(head):
+    for byte_order_mark, encoding in BYTE_ORDER_MARKS:
+        if head.startswith(byte_order_mark):
+            return encoding
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        # Spreadsheet programs on Windows save CSVs in the local code page.
+        return "cp1252"
+    return "utf-8"
+
+
+def sniff_delimiter(header):
+    try:
+        return csv.Sniffer().sniff(header, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def decode_upload(contents, chunk_size=DECODE_CHUNK_SIZE):
+    """Decode a ``dcc.Upload`` data URL into a binary file object.
+
+    The base64 payload is decoded chunk by chunk into a spooled temporary file, so
+    neither the full decoded bytes nor a decoded ``str`` copy is ever held in memory
+    next to the original payload. Large uploads spill over to disk.
+    """
+    offset = contents.index(",") + 1
+    buffer = tempfile.SpooledTemporaryFile(max_size=settings.INGEST_SPOOL_MAX_SIZE)
+    for start in range(offset, len(contents), chunk_size):
+        buffer.write(base64.b64decode(contents[start:start + chunk_size]))
+    buffer.seek(0)
+    return buffer
+
+
+def spool_stream(stream, key, size=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Copy a raw export stream, e.g. a request body, into a spooled temporary file.
+
+    The head of the stream is preflighted before the rest is read, and reading stops
+    as soon as the maximum size is exceeded. Every chunk is fed to ``key``. Returns the
+    buffer and the format found by the preflight.
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=settings.INGEST_SPOOL_MAX_SIZE)
+    try:
+        head = b""
+        while len(head) < PREFLIGHT_SIZE:
+            chunk = stream.read(PREFLIGHT_SIZE - len(head))
+            if not chunk:
+                break
+            head += chunk
+        upload_format = preflight(head, size if size is not None else len(head))
+        written = len(head)
+        buffer.write(head)
+        key.update(head)
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > settings.INGEST_MAX_UPLOAD_BYTES:
+                raise FileTooLarge(written, settings.INGEST_MAX_UPLOAD_BYTES)
+            buffer.write(chunk)
+            key.update(chunk)
+    except Exception:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer, upload_format
+
+
+def read_transactions(buffer, file_format="csv", compression=None, encoding="utf-8", delimiter=","):
+    """Read the transactions of an export in the format found by ``preflight``."""
+    if file_format == "parquet":
+        return read_parquet(buffer)
+    if file_format == "arrow":
+        return read_arrow(buffer)
+    with open_decompressed(buffer, compression) as csv_buffer:
+        # A callable keeps unknown columns out of the frame without failing on missing
+        # ones, so that get_stats can still report them with FileMissingColumn.
+        return pd.read_csv(csv_buffer, usecols=lambda column: column in NEEDED_DF_COLUMNS,
+                           dtype=TRANSACTION_DTYPES, encoding=encoding, sep=delimiter)
+
+
+def open_decompressed(buffer, compression):
+    """``buffer`` decompressed on the fly, failing once more than the maximum size came out of it."""
+    if compression is None:
+        return contextlib.nullcontext(buffer)
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=buffer, mode="rb")
+    else:
+        stream = open_zip_member(buffer)
+    return io.BufferedReader(LimitedReader(stream, settings.INGEST_MAX_DECOMPRESSED_BYTES))
+
+
+def open_zip_member(buffer):
+    try:
+        archive = zipfile.ZipFile(buffer)
+    except zipfile.BadZipFile:
+        raise InvalidFileFormat()
+    # Archives made on macOS carry resource forks next to the file.
+    members = [member for member in archive.infolist()
+               if not member.is_dir() and not member.filename.startswith("__MACOSX/")]
+    if len(members) != 1:
+        raise InvalidFileFormat("Zip files must hold a single CSV export.")
+    return archive.open(members[0])
+
+
+class LimitedReader(io.RawIOBase):
+    """Read ``stream`` and raise ``FileTooLarge`` once more than ``max_size`` bytes were read from it."""
+
+    def __init__(self, stream, max_size):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise FileTooLarge(self.size, self.max_size)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.stream.close()
+        super().close()
+
+
+def read_parquet(buffer):
+    # pyarrow is optional and slow to import, so it is only imported by uploads that need it.
+    import pyarrow.parquet
+
+    parquet_file = pyarrow.parquet.ParquetFile(buffer)
+    # Only the needed columns are read from the file at all.
+    columns = [column for column in parquet_file.schema_arrow.names if column in NEEDED_DF_COLUMNS]
+    return to_transactions(parquet_file.read(columns=columns))
+
+
+def read_arrow(buffer):
+    import pyarrow.ipc
+
+    is_file = buffer.read(len(ARROW_FILE_MAGIC)) == ARROW_FILE_MAGIC
+    buffer.seek(0)
+    reader = pyarrow.ipc.open_file(buffer) if is_file else pyarrow.ipc.open_stream(buffer)
+    table = reader.read_all()
+    return to_transactions(table.select([column for column in table.column_names if column in NEEDED_DF_COLUMNS]))
+
+
+def to_transactions(table):
+    df = table.to_pandas()
+    return df.astype({column: dtype for column, dtype in TRANSACTION_DTYPES.items() if column in df})
+
+
+def load_upload(contents, filename, progress=no_progress):
+    with observe_stage("preflight"):
+        upload_format = preflight_upload(contents)
+    with track_peak_memory(filename):
+        with observe_stage("decode", len(contents), unit="bytes"):
+            buffer = decode_upload(contents)
+        with buffer:
+            progress("decoded")
+            with observe_stage("parse", get_buffer_size(buffer), unit="bytes"):
+                df = read_transactions(buffer, **upload_format)
+    progress("parsed")
+    return df
+
+
+def load_file(path):
+    """Load an export from disk, the way ``load_upload`` loads an uploaded one."""
+    with observe_stage("preflight"):
+        upload_format = preflight_file(path)
+    with observe_stage("parse", os.path.getsize(path), unit="bytes"), open(path, "rb") as file:
+        return read_transactions(file, **upload_format)
+
+
+def get_buffer_size(buffer):
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    return size
+
+
+def merge_transactions(frames):
+    # Yearly exports overlap at their edges, so rows present in several files are kept once.
+    return concat_transactions(frames).drop_duplicates().reset_index(drop=True)
+
+
+def concat_transactions(frames):
+    df = pd.concat(frames, ignore_index=True)
+    # Categoricals whose categories differ between files are concatenated as objects.
+    return df.astype({column: "category" for column in CATEGORY_COLUMNS if column in df})
+
+
+@contextlib.contextmanager
+def track_peak_memory(label):
+    """Log the peak traced memory of the block.
+
+    tracemalloc is process-wide, so concurrent ingests share one trace: the first one
+    starts it and resets its peak, the last one stops it, and while they overlap each
+    logs the peak of them all.
+    """
+    global _tracked_ingests, _started_tracing
+    if not settings.INGEST_TRACK_MEMORY:
+        yield
+        return
+
+    with _tracking_lock:
+        if _tracked_ingests == 0:
+            _started_tracing = not tracemalloc.is_tracing()
+            if _started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        _tracked_ingests += 1
+        overlapping = _tracked_ingests > 1
+    try:
+        yield
+    finally:
+        with _tracking_lock:
+            _, peak = tracemalloc.get_traced_memory()
+            overlapping = overlapping or _tracked_ingests > 1
+            _tracked_ingests -= 1
+            if _tracked_ingests == 0 and _started_tracing:
+                tracemalloc.stop()
+        logger.info("Ingest of %s peaked at %.1f MiB%s", label, peak / (1024 * 1024),
+                    " (shared with concurrent ingests)" if overlapping else "")
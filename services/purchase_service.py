@@ -1,19 +1,13 @@
 import dash_bootstrap_components as dbc
 import dash_html_components as html
 
-from services.graph_service import get_timeline_chart, get_scatter_plot, get_bar_chart
+from services.aggregation_service import get_totals, get_description_totals
+from services.graph_service import get_scatter_plot, get_bar_chart
+from utils.constants import PURCHASE_KIND
 
 
-def get_total_purchase_stats(df_crypto_purchase, native_currency):
-    df_crypto_purchase["Transaction Description"] = df_crypto_purchase["Transaction Description"].str.replace("Buy", "")
-    df_crypto_purchase_grouped = df_crypto_purchase.groupby(["Transaction Kind"]).sum()
-
-    if df_crypto_purchase.empty:
-        native_amount = 0
-        native_amount_usd = 0
-    else:
-        native_amount = round(float(df_crypto_purchase_grouped["Native Amount"]), 2)
-        native_amount_usd = round(float(df_crypto_purchase_grouped["Native Amount (in USD)"]), 2)
+def get_total_purchase_stats(aggregates, native_currency):
+    native_amount, native_amount_usd = get_totals(aggregates, [PURCHASE_KIND])
 
     purchase_total_data = html.Div(
         [
@@ -29,6 +23,7 @@ def get_total_purchase_stats(df_crypto_purchase, native_currency):
                         className="total-info-label",
                     ),
                 ],
+                className="currency-native",
             ),
             html.P(
                 children=[
@@ -38,7 +33,7 @@ def get_total_purchase_stats(df_crypto_purchase, native_currency):
                     ),
                     html.Span(f" USD", className="total-info-label"),
                 ],
-                className="total-info-data",
+                className="total-info-data currency-usd",
             ),
         ],
         className="total-info",
@@ -46,10 +41,11 @@ def get_total_purchase_stats(df_crypto_purchase, native_currency):
     return purchase_total_data
 
 
-def get_purchase_graphs(df_crypto_purchase, native_currency):
+def get_purchase_graphs(aggregates, df_crypto_purchase, native_currency, index):
+    """The purchase charts, keyed by name. The timeline is looked up separately, see ``get_period_totals``."""
     if df_crypto_purchase.empty:
-        return [
-            html.Div([
+        return {
+            "purchase_alert": html.Div([
                 dbc.Row(
                     dbc.Col(
                         dbc.Alert(
@@ -65,37 +61,27 @@ def get_purchase_graphs(df_crypto_purchase, native_currency):
                     )
                 )
             ]
-            )]
+            )}
 
-    df_crypto_purchase_grouped_type = df_crypto_purchase.groupby(["Transaction Kind", "Transaction Description"],
-                                                                 as_index=False).sum()
-    df_crypto_purchase_grouped_type["Transaction Description"] = df_crypto_purchase_grouped_type[
-        "Transaction Description"].str.replace("Buy", "")
-    df_crypto_purchase_grouped_type_date = (
-        df_crypto_purchase.groupby(["YearMonth"], as_index=False).sum().sort_values(by="YearMonth"))
+    df_crypto_purchase_grouped_type = get_description_totals(aggregates, [PURCHASE_KIND])
+    df_crypto_purchase_grouped_type["Transaction Description"] = strip_buy_prefix(
+        df_crypto_purchase_grouped_type["Transaction Description"])
+    df_crypto_purchase = df_crypto_purchase.assign(**{
+        "Transaction Description": strip_buy_prefix(df_crypto_purchase["Transaction Description"].astype("category"))
+    })
 
-    timeline = get_timeline_chart(df_crypto_purchase_grouped_type_date, 'YearMonth', 'Native Amount', 'purchases',
-                                  native_currency)
     purchases_bar_chart = get_bar_chart(df_crypto_purchase_grouped_type, "Transaction Description", "Native Amount",
-                                        f"Purchases in {native_currency}", 'purchases')
+                                        "Purchases in {currency}", 'purchases', index, native_currency)
     scatter_plot = get_scatter_plot(df_crypto_purchase, "Timestamp (UTC)", "Native Amount", "Transaction Description",
-                                    "Native Amount", 'purchase')
+                                    "Native Amount", 'purchase', index)
+
+    return {
+        "purchase_bar_chart": purchases_bar_chart,
+        "purchase_scatter_plot": scatter_plot,
+    }
 
-    graphs = html.Div(
-        children=[
-            dbc.Row(
-                children=[
-                    dbc.Col(purchases_bar_chart, width=6),
-                    dbc.Col(timeline, width=6)
-                ],
-            ),
-            dbc.Row(
-                children=[
-                    dbc.Col(children=scatter_plot)
-                ],
-                no_gutters=True
-            )
-        ],
-    )
 
-    return graphs
+def strip_buy_prefix(descriptions):
+    # On categorical columns only the distinct descriptions are rewritten, not every row.
+    return descriptions.map(
+        lambda description: description.replace("Buy", "") if isinstance(description, str) else description)
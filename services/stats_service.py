@@ -1,35 +1,192 @@
 from errors.custom import FileMissingColumn
+from services.aggregation_service import aggregate, build_cube, get_period_totals, get_totals
 from services.purchase_service import get_total_purchase_stats, get_purchase_graphs
 from services.earnings_service import get_total_earning_stats, get_total_earnings_breakdown, get_earnings_graphs
-from utils.constants import NEEDED_DF_COLUMNS
+from services.graph_service import get_timeline_figure
+from services.holdings_service import get_holdings_section
+from utils.constants import NEEDED_DF_COLUMNS, PURCHASE_KIND, EARNING_KINDS, TIMESTAMP_FORMAT
+from utils.metrics import observe_stage
 import pandas as pd
 
 
+SECTIONS = ["purchases", "holdings", "earnings"]
+
+# Transaction kinds summed in the timeline of each section that has one.
+TIMELINE_KINDS = {
+    "purchases": [PURCHASE_KIND],
+    "earnings": EARNING_KINDS,
+}
+
+
 def get_stats(data):
+    prepare_transactions(data)
+
+    native_currency = get_native_currency(data)
+    stats = render_totals(data, native_currency)
+    stats["native_currency"] = native_currency
+    stats["filters"] = get_filter_options(data)
+    return stats
+
+
+def get_summary(data, monthly=False):
+    """The dashboard totals as plain numbers, for callers that do not render components.
+
+    With ``monthly`` the monthly series of every transaction kind are included as well.
+    """
+    prepare_transactions(data)
+    aggregates = get_aggregates(data)
+    filters = get_filter_options(data)
+    total_purchases, total_purchases_usd = get_totals(aggregates, [PURCHASE_KIND])
+    total_earnings, total_earnings_usd = get_totals(aggregates, EARNING_KINDS)
+    summary = {
+        "rows": len(data),
+        "native_currency": get_native_currency(data),
+        "start_date": filters["start_date"],
+        "end_date": filters["end_date"],
+        "total_purchases": total_purchases,
+        "total_purchases_usd": total_purchases_usd,
+        "total_earnings": total_earnings,
+        "total_earnings_usd": total_earnings_usd,
+        "kinds": {
+            kind: dict(zip(["native", "usd"], get_totals(aggregates, [kind])))
+            for kind in aggregates["kinds"].index if isinstance(kind, str)
+        },
+    }
+    if monthly:
+        summary["monthly"] = get_monthly_series(aggregates)
+    return summary
+
+
+def get_monthly_series(aggregates):
+    series = aggregates["monthly"].reset_index()
+    return [
+        {"kind": kind, "month": month.strftime("%Y-%m"), "native": round(float(native), 2),
+         "usd": round(float(usd), 2)}
+        for kind, month, native, usd in zip(series["Transaction Kind"], series["YearMonth"],
+                                            series["Native Amount"], series["Native Amount (in USD)"])
+        if isinstance(kind, str) and not pd.isna(month)
+    ]
 
-    are_columns_valid = all(item in list(data) for item in NEEDED_DF_COLUMNS)
+
+def prepare_transactions(data):
+    validate_columns(data)
+
+    with observe_stage("timestamps", len(data)):
+        prepare_timestamps(data)
+
+
+def validate_columns(data):
+    with observe_stage("validate", len(data)):
+        are_columns_valid = all(item in list(data) for item in NEEDED_DF_COLUMNS)
 
     if not are_columns_valid:
         raise FileMissingColumn()
 
-    native_currency = data["Native Currency"][0]
 
-    data["Timestamp (UTC)"] = pd.to_datetime(data["Timestamp (UTC)"]).apply(lambda x: x.date())
-    data["YearMonth"] = (data["Timestamp (UTC)"] + pd.offsets.MonthEnd(-1) + pd.offsets.Day(1))
+def get_native_currency(data):
+    """Currency of the native amounts, or None for an export without any transaction."""
+    if data.empty:
+        return None
+    return data["Native Currency"].iloc[0]
+
+
+def get_aggregates(data):
+    with observe_stage("aggregate", len(data)):
+        return aggregate(data)
+
+
+def render_totals(data, native_currency):
+    return render_aggregate_totals(get_aggregates(data), native_currency)
+
+
+def render_aggregate_totals(aggregates, native_currency):
+    return {
+        "total_purchases": get_total_purchase_stats(aggregates, native_currency),
+        "total_earnings": get_total_earning_stats(aggregates, native_currency),
+    }
+
+
+def render_section(section, data, native_currency, index):
+    # Sections are rendered on demand, so figures of sections nobody opens are never built.
+    # ``index`` is the one of the dashboard that shows the section, charts carry it in their ids.
+    if section == "holdings":
+        with observe_stage("cost_basis", len(data)):
+            return get_holdings_section(data, native_currency, index)
+
+    aggregates = get_aggregates(data)
+    if section == "purchases":
+        df_crypto_purchase = data[data["Transaction Kind"] == PURCHASE_KIND]
+        return get_purchase_graphs(aggregates, df_crypto_purchase, native_currency, index)
+    if section == "earnings":
+        df_crypto_earnings = data[data["Transaction Kind"].isin(EARNING_KINDS)]
+        return {
+            "earnings_break_down": get_total_earnings_breakdown(aggregates, native_currency),
+            **get_earnings_graphs(aggregates, df_crypto_earnings, native_currency, index),
+        }
+    raise ValueError(f"Unknown dashboard section: {section}")
+
+
+def get_cube(data):
+    with observe_stage("cube", len(data)):
+        return build_cube(data)
+
+
+def render_timeline(section, cube, granularity, native_currency):
+    return get_timeline_figure(get_period_totals(cube, granularity, TIMELINE_KINDS[section]), "Period",
+                               "Native Amount", section, native_currency)
+
 
-    df_crypto_purchase = data[(data["Transaction Kind"] == "crypto_purchase")]
-    df_crypto_earnings = data[(data["Transaction Kind"] == "crypto_earn_interest_paid") |
-                              (data["Transaction Kind"] == "reimbursement") |
-                              (data["Transaction Kind"] == "mco_stake_reward") |
-                              (data["Transaction Kind"] == "referral_card_cashback") |
-                              (data["Transaction Kind"] == "referral_gift")
-                              ]
+def prepare_timestamps(data):
+    timestamps = parse_timestamps(data["Timestamp (UTC)"])
+    # The columns stay datetime64: days via normalize, months by truncating the
+    # datetime64 unit, so no per-row Python objects are created. The exact time orders
+    # transactions within a day for the cost basis, whichever file they came from.
+    data["Exact Timestamp (UTC)"] = timestamps
+    data["Timestamp (UTC)"] = timestamps.dt.normalize()
+    data["YearMonth"] = timestamps.values.astype("datetime64[M]").astype("datetime64[ns]")
+
+
+def parse_timestamps(timestamps):
+    try:
+        return pd.to_datetime(timestamps, format=TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return pd.to_datetime(timestamps)
+
+
+def get_filter_options(data):
+    return {
+        "start_date": to_date_string(data["Timestamp (UTC)"].min()),
+        "end_date": to_date_string(data["Timestamp (UTC)"].max()),
+        "currencies": sorted(data["Currency"].dropna().unique()),
+        "kinds": sorted(data["Transaction Kind"].dropna().unique()),
+    }
+
+
+def merge_filter_options(options, other):
+    if options is None:
+        return other
+    start_dates = [date for date in (options["start_date"], other["start_date"]) if date]
+    end_dates = [date for date in (options["end_date"], other["end_date"]) if date]
     return {
-        "total_purchases": get_total_purchase_stats(df_crypto_purchase, native_currency),
-        "total_earnings": get_total_earning_stats(df_crypto_earnings, native_currency),
-        "purchase_graphs": get_purchase_graphs(df_crypto_purchase, native_currency),
-        "earnings_break_down": get_total_earnings_breakdown(df_crypto_earnings, native_currency),
-        "earning_graphs": get_earnings_graphs(df_crypto_earnings, native_currency)
+        "start_date": min(start_dates, default=None),
+        "end_date": max(end_dates, default=None),
+        "currencies": sorted(set(options["currencies"]) | set(other["currencies"])),
+        "kinds": sorted(set(options["kinds"]) | set(other["kinds"])),
     }
 
 
+def to_date_string(timestamp):
+    return None if pd.isna(timestamp) else timestamp.date().isoformat()
+
+
+def filter_transactions(data, start_date=None, end_date=None, currencies=None, kinds=None):
+    mask = pd.Series(True, index=data.index)
+    if start_date:
+        mask &= data["Timestamp (UTC)"] >= pd.Timestamp(start_date)
+    if end_date:
+        mask &= data["Timestamp (UTC)"] <= pd.Timestamp(end_date)
+    if currencies:
+        mask &= data["Currency"].isin(currencies)
+    if kinds:
+        mask &= data["Transaction Kind"].isin(kinds)
+    return data[mask]
@@ -1,3 +1,89 @@
+import os
+import tempfile
+
+LOG_LEVEL = os.environ.get("CRORACLE_LOG_LEVEL", "INFO")
+
+# Default directory of the caches, stores, metrics and admission tickets below. The app unpickles
+# some of them, so it creates the directory for its own user only and refuses one owned by another.
+STATE_DIR = os.environ.get("CRORACLE_STATE_DIR", os.path.join(tempfile.gettempdir(), f"croracle-{os.getuid()}"))
+
+# Under gunicorn, import the app once in the master and fork the workers from it, so they start
+# in milliseconds and share the imported modules copy-on-write. Modules the app imports on first
+# use only are imported in the master as well.
+PRELOAD_APP = os.environ.get("CRORACLE_PRELOAD_APP", "1") == "1"
+PRELOAD_MODULES = [module for module in
+                   os.environ.get("CRORACLE_PRELOAD_MODULES", "plotly.express").split(",") if module]
+# Request threads per gunicorn worker, so that an upload waiting for admission does not hold up
+# the other requests of its worker.
+WEB_THREADS = int(os.environ.get("CRORACLE_WEB_THREADS", 4))
+
+# Uploads whose decoded size is larger than this are rejected before they are decoded.
+INGEST_MAX_UPLOAD_BYTES = int(os.environ.get("CRORACLE_INGEST_MAX_UPLOAD_BYTES", 256 * 1024 * 1024))
+# Compressed uploads fail once they decompress to more than this.
+INGEST_MAX_DECOMPRESSED_BYTES = int(os.environ.get("CRORACLE_INGEST_MAX_DECOMPRESSED_BYTES", 1024 * 1024 * 1024))
+# Uploads larger than this are spooled to a temporary file while being decoded.
+INGEST_SPOOL_MAX_SIZE = int(os.environ.get("CRORACLE_INGEST_SPOOL_MAX_SIZE", 32 * 1024 * 1024))
+# Log the peak Python heap usage of every upload. Tracing slows ingest down noticeably.
+INGEST_TRACK_MEMORY = os.environ.get("CRORACLE_INGEST_TRACK_MEMORY", "0") == "1"
+
+# Size of the process pool that handles multi-file uploads, per server worker.
+UPLOAD_PROCESS_WORKERS = int(os.environ.get("CRORACLE_UPLOAD_PROCESS_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Uploads processed at once on the host, by all workers together, and the decoded bytes they may hold.
+# Uploads over either limit wait up to ADMISSION_MAX_WAIT_SECONDS, checking for room every
+# ADMISSION_POLL_INTERVAL_SECONDS, with at most ADMISSION_MAX_QUEUE of them waiting, and are turned
+# away with a "busy, retry" alert after that.
+ADMISSION_MAX_CONCURRENT = int(os.environ.get("CRORACLE_ADMISSION_MAX_CONCURRENT", 2))
+ADMISSION_MAX_BYTES = int(os.environ.get("CRORACLE_ADMISSION_MAX_BYTES", 256 * 1024 * 1024))
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get("CRORACLE_ADMISSION_MAX_WAIT_SECONDS", 20))
+ADMISSION_MAX_QUEUE = int(os.environ.get("CRORACLE_ADMISSION_MAX_QUEUE", 8))
+ADMISSION_POLL_INTERVAL_SECONDS = float(os.environ.get("CRORACLE_ADMISSION_POLL_INTERVAL_SECONDS", 0.05))
+ADMISSION_PATH = os.environ.get("CRORACLE_ADMISSION_PATH", os.path.join(STATE_DIR, "admission.sqlite3"))
+
+# Run uploads as background jobs that the page polls for progress, instead of inside the request.
+BACKGROUND_JOBS = os.environ.get("CRORACLE_BACKGROUND_JOBS", "0") == "1"
+JOB_WORKERS = int(os.environ.get("CRORACLE_JOB_WORKERS", 2))
+JOB_STORE_PATH = os.environ.get("CRORACLE_JOB_STORE_PATH", os.path.join(STATE_DIR, "jobs.sqlite3"))
+JOB_TTL_SECONDS = int(os.environ.get("CRORACLE_JOB_TTL_SECONDS", 60 * 60))
+JOB_POLL_INTERVAL_MS = int(os.environ.get("CRORACLE_JOB_POLL_INTERVAL_MS", 500))
+
+# Scatter plots switch to WebGL above this many rows and are downsampled to at most the point budget.
+SCATTER_WEBGL_THRESHOLD = int(os.environ.get("CRORACLE_SCATTER_WEBGL_THRESHOLD", 5000))
+SCATTER_POINT_BUDGET = int(os.environ.get("CRORACLE_SCATTER_POINT_BUDGET", 20000))
+
+# Float values in figures are rounded to this many decimals; amounts are shown in cents.
+FIGURE_FLOAT_DECIMALS = 2
+
+# Response compression, in order of preference when the browser accepts several. Empty disables it.
+COMPRESS_ALGORITHMS = [algorithm for algorithm in
+                       os.environ.get("CRORACLE_COMPRESS_ALGORITHMS", "br,gzip").split(",") if algorithm]
+COMPRESS_GZIP_LEVEL = int(os.environ.get("CRORACLE_COMPRESS_GZIP_LEVEL", 6))
+# Brotli's default quality of 11 costs far more CPU than it saves in bytes for JSON payloads.
+COMPRESS_BR_LEVEL = int(os.environ.get("CRORACLE_COMPRESS_BR_LEVEL", 4))
+COMPRESS_MIN_SIZE = int(os.environ.get("CRORACLE_COMPRESS_MIN_SIZE", 500))
+
+# Results of processed uploads, shared by all workers on the host. A size of 0 disables the cache.
+RESULT_CACHE_PATH = os.environ.get("CRORACLE_RESULT_CACHE_PATH", os.path.join(STATE_DIR, "results.sqlite3"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("CRORACLE_RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get("CRORACLE_RESULT_CACHE_TTL_SECONDS", 24 * 60 * 60))
+# Part of every cache key; bump it whenever the cached stats change shape.
+RESULT_CACHE_VERSION = "9"
+
+# Prepared frames of processed uploads, used to recompute filtered views without a re-upload.
+DATASET_STORE_DIR = os.environ.get("CRORACLE_DATASET_STORE_DIR", os.path.join(STATE_DIR, "datasets"))
+DATASET_TTL_SECONDS = int(os.environ.get("CRORACLE_DATASET_TTL_SECONDS", 24 * 60 * 60))
+
+# Transaction histories that uploads in append mode are added to, one per browser.
+HISTORY_STORE_DIR = os.environ.get("CRORACLE_HISTORY_STORE_DIR", os.path.join(STATE_DIR, "histories"))
+HISTORY_TTL_SECONDS = int(os.environ.get("CRORACLE_HISTORY_TTL_SECONDS", 180 * 24 * 60 * 60))
+
+# Per-stage histograms served on /metrics, collected from all workers on the host.
+METRICS_ENABLED = os.environ.get("CRORACLE_METRICS_ENABLED", "1") == "1"
+METRICS_PATH = os.environ.get("CRORACLE_METRICS_PATH", os.path.join(STATE_DIR, "metrics.sqlite3"))
+# Uploads taking longer than this many seconds get their cProfile output logged and saved. 0 disables profiling.
+SLOW_UPLOAD_SECONDS = float(os.environ.get("CRORACLE_SLOW_UPLOAD_SECONDS", 0))
+SLOW_UPLOAD_PROFILE_DIR = os.environ.get("CRORACLE_SLOW_UPLOAD_PROFILE_DIR", os.path.join(STATE_DIR, "profiles"))
+
 INDEX_GA_STRING = """<!DOCTYPE html>
 <html>
     <head>
@@ -0,0 +1,24 @@
+"""Keep the stores, metrics and admission tickets of the tests apart from those of the host."""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+STATE_DIR = tempfile.mkdtemp(prefix="croracle-test-")
+os.environ.update({
+    "CRORACLE_STATE_DIR": STATE_DIR,
+    "CRORACLE_DATASET_STORE_DIR": os.path.join(STATE_DIR, "datasets"),
+    "CRORACLE_HISTORY_STORE_DIR": os.path.join(STATE_DIR, "histories"),
+    "CRORACLE_RESULT_CACHE_PATH": os.path.join(STATE_DIR, "results.sqlite3"),
+    "CRORACLE_JOB_STORE_PATH": os.path.join(STATE_DIR, "jobs.sqlite3"),
+    "CRORACLE_METRICS_PATH": os.path.join(STATE_DIR, "metrics.sqlite3"),
+    "CRORACLE_ADMISSION_PATH": os.path.join(STATE_DIR, "admission.sqlite3"),
+    "CRORACLE_SLOW_UPLOAD_PROFILE_DIR": os.path.join(STATE_DIR, "profiles"),
+})
+
+
+@pytest.fixture(scope="session", autouse=True)
+def remove_state_dir():
+    yield
+    shutil.rmtree(STATE_DIR, ignore_errors=True)
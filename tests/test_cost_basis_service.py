@@ -0,0 +1,159 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.cost_basis_service import HOLDINGS_EPSILON, get_cost_basis, get_transaction_legs
+from services.ingest_service import load_file
+from services.stats_service import prepare_transactions
+from utils.constants import TRANSFER_KINDS
+
+NATIVE_CURRENCY = "EUR"
+COLUMNS = ["Timestamp (UTC)", "Transaction Description", "Currency", "Amount", "To Currency", "To Amount",
+           "Native Currency", "Native Amount", "Native Amount (in USD)", "Transaction Kind"]
+RESULT_COLUMNS = ["holdings", "average_basis", "fifo_basis", "average_realized", "fifo_realized"]
+
+
+def make_export(rows):
+    """An export of ``rows`` (time, currency, amount, to currency, to amount, native amount, kind), newest first."""
+    return pd.DataFrame([
+        {"Timestamp (UTC)": timestamp, "Transaction Description": kind, "Currency": currency, "Amount": amount,
+         "To Currency": to_currency, "To Amount": to_amount, "Native Currency": NATIVE_CURRENCY,
+         "Native Amount": native_amount, "Native Amount (in USD)": native_amount, "Transaction Kind": kind}
+        for timestamp, currency, amount, to_currency, to_amount, native_amount, kind in rows
+    ], columns=COLUMNS)
+
+
+def get_random_export(rows, seed):
+    random = np.random.default_rng(seed)
+    assets = np.array(["BTC", "ETH", "CRO"], dtype=object)
+    currency = assets[random.integers(0, len(assets), rows)]
+    amount = random.uniform(0.1, 2, rows).round(8)
+    # Sales often exceed what is held, so the basis restarts from zero now and then.
+    amount = np.where(random.random(rows) < 0.4, -amount, amount)
+    is_exchange = random.random(rows) < 0.1
+    to_currency = np.where(is_exchange, assets[random.integers(0, len(assets), rows)], None)
+    is_exchange &= to_currency != currency
+    amount = np.where(is_exchange, -np.abs(amount), amount)
+    kind = np.where(is_exchange, "crypto_exchange",
+                    np.where(random.random(rows) < 0.05, random.choice(TRANSFER_KINDS, rows), "crypto_purchase"))
+    # Few distinct seconds, so many legs of one asset share their time.
+    seconds = np.sort(random.integers(0, rows // 4, rows))[::-1]
+    timestamps = (pd.Timestamp("2021-01-01") + pd.to_timedelta(seconds, unit="s")).strftime("%Y-%m-%d %H:%M:%S")
+    return make_export(zip(timestamps, currency, amount, np.where(is_exchange, to_currency, None),
+                           np.where(is_exchange, random.uniform(0.1, 1, rows).round(8), np.nan),
+                           random.uniform(1, 100, rows).round(2), kind))
+
+
+def get_legs(export, tmp_path):
+    path = tmp_path / "export.csv"
+    export.to_csv(path, index=False)
+    data = load_file(str(path))
+    prepare_transactions(data)
+    return get_cost_basis(get_transaction_legs(data, NATIVE_CURRENCY))
+
+
+def get_reference(export):
+    """Holdings, basis and realized profit after every leg, one transaction at a time, per asset."""
+    timestamps = pd.to_datetime(export["Timestamp (UTC)"])
+    # Exports list the newest transactions first, so at equal times later rows happened earlier.
+    order = sorted(range(len(export)), key=lambda position: (timestamps[position], -position))
+    states = {}
+    results = {}
+    for position in order:
+        row = export.iloc[position]
+        value = abs(row["Native Amount"])
+        for asset, quantity in [(row["Currency"], row["Amount"]), (row["To Currency"], row["To Amount"])]:
+            if pd.isna(asset) or asset == NATIVE_CURRENCY or pd.isna(quantity) or quantity == 0:
+                continue
+            state = states.setdefault(asset, {"holdings": 0.0, "average": 0.0, "lots": deque()})
+            previous_average = state["average"]
+            previous_fifo = sum(lot_quantity * price for lot_quantity, price in state["lots"])
+            if quantity > 0:
+                state["holdings"] += quantity
+                state["average"] += value
+                state["lots"].append([quantity, value / quantity])
+            else:
+                previous = state["holdings"]
+                # Units sold beyond the holdings were bought before the export and are ignored.
+                state["holdings"] = max(previous + quantity, 0.0)
+                ratio = state["holdings"] / previous if previous > HOLDINGS_EPSILON else 0.0
+                state["average"] = state["average"] * ratio if ratio > HOLDINGS_EPSILON else 0.0
+                remaining = -quantity
+                while remaining > 0 and state["lots"]:
+                    lot = state["lots"][0]
+                    taken = min(lot[0], remaining)
+                    lot[0] -= taken
+                    remaining -= taken
+                    if lot[0] <= 0:
+                        state["lots"].popleft()
+            fifo = sum(lot_quantity * price for lot_quantity, price in state["lots"])
+            is_sale = quantity < 0 and row["Transaction Kind"] not in TRANSFER_KINDS
+            results.setdefault(asset, []).append((
+                state["holdings"], state["average"], fifo,
+                value - (previous_average - state["average"]) if is_sale else 0.0,
+                value - (previous_fifo - fifo) if is_sale else 0.0,
+            ))
+    return {asset: pd.DataFrame(rows, columns=RESULT_COLUMNS) for asset, rows in results.items()}
+
+
+def assert_matches_reference(export, tmp_path):
+    legs = get_legs(export, tmp_path)
+    reference = get_reference(export)
+
+    assert sorted(legs["asset"].unique()) == sorted(reference)
+    for asset, expected in reference.items():
+        actual = legs.loc[legs["asset"] == asset, RESULT_COLUMNS].reset_index(drop=True)
+        # FIFO reads its basis off a cumulative curve, so it carries the rounding of the running sums.
+        np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-6,
+                                   err_msg=f"cost basis of {asset}")
+
+
+def test_partial_sales(tmp_path):
+    export = make_export([
+        ("2021-01-05 10:00:00", "BTC", -0.5, None, None, 60.0, "crypto_viban_exchange"),
+        ("2021-01-04 10:00:00", "BTC", -1.5, None, None, 150.0, "crypto_viban_exchange"),
+        ("2021-01-03 10:00:00", "BTC", 1.0, None, None, 80.0, "crypto_purchase"),
+        ("2021-01-01 10:00:00", "BTC", 2.0, None, None, 100.0, "crypto_purchase"),
+    ])
+    assert_matches_reference(export, tmp_path)
+
+    legs = get_legs(export, tmp_path)
+    # Average: 180 for 3 units, 1.5 sold leaves 90, 0.5 more leaves 60.
+    assert legs["average_basis"].tolist() == pytest.approx([100.0, 180.0, 90.0, 60.0])
+    # FIFO: 1.5 of the first 2 units bought at 50 leave 25 + 80, then 0.5 more leave 80.
+    assert legs["fifo_basis"].tolist() == pytest.approx([100.0, 180.0, 105.0, 80.0])
+
+
+def test_sale_beyond_holdings_restarts_the_basis(tmp_path):
+    export = make_export([
+        ("2021-01-03 10:00:00", "CRO", 2.0, None, None, 120.0, "crypto_purchase"),
+        ("2021-01-02 10:00:00", "CRO", -3.0, None, None, 200.0, "crypto_viban_exchange"),
+        ("2021-01-01 10:00:00", "CRO", 1.0, None, None, 50.0, "crypto_purchase"),
+    ])
+    assert_matches_reference(export, tmp_path)
+
+    legs = get_legs(export, tmp_path)
+    assert legs["holdings"].tolist() == pytest.approx([1.0, 0.0, 2.0])
+    assert legs["average_basis"].tolist() == pytest.approx([50.0, 0.0, 120.0])
+    assert legs["fifo_basis"].tolist() == pytest.approx([50.0, 0.0, 120.0])
+
+
+def test_legs_at_the_same_time_follow_the_export_order(tmp_path):
+    # The sale is listed first, so with equal times it happened after the purchase below it.
+    export = make_export([
+        ("2021-01-01 10:00:00", "ETH", -1.0, None, None, 30.0, "crypto_viban_exchange"),
+        ("2021-01-01 10:00:00", "ETH", 2.0, None, None, 40.0, "crypto_purchase"),
+        ("2021-01-01 10:00:00", "BTC", -0.1, "ETH", 1.0, 25.0, "crypto_exchange"),
+        ("2021-01-01 09:00:00", "BTC", 0.2, None, None, 60.0, "crypto_purchase"),
+    ])
+    assert_matches_reference(export, tmp_path)
+
+    eth = get_legs(export, tmp_path).query("asset == 'ETH'")
+    assert eth["holdings"].tolist() == pytest.approx([1.0, 3.0, 2.0])
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_random_export_matches_reference(tmp_path, seed):
+    assert_matches_reference(get_random_export(2000, seed), tmp_path)
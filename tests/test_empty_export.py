@@ -0,0 +1,55 @@
+import base64
+import json
+
+import pytest
+
+from benchmarks.generator import generate_export
+from services.ingest_service import load_file
+from services.stats_service import get_native_currency, get_summary
+
+
+@pytest.fixture
+def empty_export():
+    # A valid export of an account without transactions: the header only.
+    return generate_export(0).to_csv(index=False).encode()
+
+
+@pytest.fixture
+def empty_export_path(tmp_path, empty_export):
+    path = tmp_path / "empty.csv"
+    path.write_bytes(empty_export)
+    return str(path)
+
+
+def test_native_currency_of_empty_export_is_none(empty_export_path):
+    assert get_native_currency(load_file(empty_export_path)) is None
+
+
+def test_summary_of_empty_export(empty_export_path):
+    summary = get_summary(load_file(empty_export_path), monthly=True)
+
+    assert summary["rows"] == 0
+    assert summary["native_currency"] is None
+    assert summary["total_purchases"] == summary["total_earnings"] == 0
+    assert summary["kinds"] == {}
+    assert summary["monthly"] == []
+
+
+def test_api_aggregates_of_empty_export(empty_export):
+    import app
+
+    response = app.server.test_client().post("/api/aggregates", data=empty_export)
+
+    assert response.status_code == 200
+    summary = json.loads(response.data)
+    assert summary["rows"] == 0
+    assert summary["native_currency"] is None
+
+
+def test_upload_of_empty_export_shows_no_transactions(empty_export):
+    import app
+
+    contents = "data:text/csv;base64," + base64.b64encode(empty_export).decode()
+    children = app.parse_contents(contents, "empty.csv", None)
+
+    assert "No transactions found." in json.dumps(app.to_json_ready(children))
@@ -0,0 +1,180 @@
+import contextlib
+import os
+import threading
+import time
+
+from errors.custom import ServerBusy
+from utils.sqlite import SQLiteStore
+
+
+class AdmissionController(SQLiteStore):
+    """Caps how many uploads the host works on at once and how many bytes they hold.
+
+    Every admitted or waiting upload is a ticket in the SQLite file, so the limits hold
+    across all worker processes and the pools they start. Uploads over either limit wait,
+    first come first served, for at most ``max_wait_seconds`` and with at most
+    ``max_queue`` of them waiting; otherwise ``acquire`` raises ``ServerBusy``. An upload
+    larger than ``max_bytes`` on its own is still admitted once nothing else runs.
+    Tickets of processes that died are dropped.
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS tickets ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT, pid INTEGER NOT NULL, size INTEGER NOT NULL,"
+        " admitted INTEGER NOT NULL, created_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    ]
+
+    def __init__(self, path, max_concurrent, max_bytes, max_wait_seconds, max_queue, poll_interval_seconds):
+        super().__init__(path)
+        self.max_concurrent = max_concurrent
+        self.max_bytes = max_bytes
+        self.max_wait_seconds = max_wait_seconds
+        self.max_queue = max_queue
+        self.poll_interval_seconds = poll_interval_seconds
+        self._held = threading.local()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_held"] = None
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._held = threading.local()
+
+    @contextlib.contextmanager
+    def admit(self, size):
+        if getattr(self._held, "ticket", None) is not None:
+            # Admitted further up in this thread, e.g. a background job admitted before it was queued.
+            yield
+            return
+        ticket = self.acquire(size)
+        with self.hold(ticket):
+            yield
+
+    def acquire(self, size):
+        """Id of an admitted ticket for ``size`` bytes, waiting for room if needed."""
+        deadline = time.monotonic() + self.max_wait_seconds
+        ticket, admitted = self._enter(size)
+        try:
+            while not admitted:
+                if time.monotonic() >= deadline:
+                    self._reject(ticket)
+                time.sleep(self.poll_interval_seconds)
+                admitted = self._promote(ticket, size)
+        except BaseException:
+            self.release(ticket)
+            raise
+        return ticket
+
+    @contextlib.contextmanager
+    def hold(self, ticket):
+        """Run under an admitted ticket and release it at the end.
+
+        The ticket moves to the current process first, so that it is dropped if this
+        process dies, whichever process acquired it.
+        """
+        with self._transaction() as connection:
+            connection.execute("UPDATE tickets SET pid = ? WHERE id = ?", (os.getpid(), ticket))
+        self._held.ticket = ticket
+        try:
+            yield
+        finally:
+            self._held.ticket = None
+            self.release(ticket)
+
+    def release(self, ticket):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM tickets WHERE id = ?", (ticket,))
+
+    def stats(self):
+        """Limits and the uploads admitted and waiting on the whole host."""
+        with self._transaction() as connection:
+            active, in_flight_bytes = self._count_admitted(connection)
+            processes, waiting = connection.execute(
+                "SELECT COUNT(DISTINCT pid), COUNT(*) - SUM(admitted) FROM tickets").fetchone()
+            row = connection.execute("SELECT value FROM counters WHERE name = 'rejected'").fetchone()
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_bytes": self.max_bytes,
+            "max_wait_seconds": self.max_wait_seconds,
+            "max_queue": self.max_queue,
+            "processes": processes,
+            "active": active,
+            "waiting": waiting or 0,
+            "in_flight_bytes": in_flight_bytes,
+            "rejected": row[0] if row is not None else 0,
+        }
+
+    def _enter(self, size):
+        with self._transaction() as connection:
+            waiting = connection.execute("SELECT COUNT(*) FROM tickets WHERE admitted = 0").fetchone()[0]
+            # Nobody jumps the queue: a new upload runs at once only when nothing is waiting.
+            admitted = waiting == 0 and self._has_room(connection, size)
+            rejected = not admitted and waiting >= self.max_queue
+            if rejected:
+                self._count_rejected(connection)
+            else:
+                ticket = connection.execute(
+                    "INSERT INTO tickets (pid, size, admitted, created_at) VALUES (?, ?, ?, ?)",
+                    (os.getpid(), size, int(admitted), time.time()),
+                ).lastrowid
+        if rejected:
+            raise ServerBusy()
+        return ticket, admitted
+
+    def _promote(self, ticket, size):
+        with self._transaction() as connection:
+            first = connection.execute("SELECT MIN(id) FROM tickets WHERE admitted = 0").fetchone()[0]
+            if first != ticket or not self._has_room(connection, size):
+                return False
+            connection.execute("UPDATE tickets SET admitted = 1 WHERE id = ?", (ticket,))
+        return True
+
+    def _reject(self, ticket):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM tickets WHERE id = ?", (ticket,))
+            self._count_rejected(connection)
+        raise ServerBusy()
+
+    def _has_room(self, connection, size):
+        active, in_flight_bytes = self._count_admitted(connection)
+        if active >= self.max_concurrent:
+            return False
+        return active == 0 or in_flight_bytes + size <= self.max_bytes
+
+    @staticmethod
+    def _count_admitted(connection):
+        return connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tickets WHERE admitted = 1").fetchone()
+
+    @staticmethod
+    def _count_rejected(connection):
+        connection.execute(
+            "INSERT INTO counters (name, value) VALUES ('rejected', 1)"
+            " ON CONFLICT (name) DO UPDATE SET value = value + 1")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so that no other process admits
+        # between counting the tickets and adding one.
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                pids = [pid for pid, in connection.execute("SELECT DISTINCT pid FROM tickets")]
+                dead = [(pid,) for pid in pids if not is_alive(pid)]
+                if dead:
+                    connection.executemany("DELETE FROM tickets WHERE pid = ?", dead)
+                yield connection
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
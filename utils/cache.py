@@ -0,0 +1,136 @@
+import base64
+import hashlib
+import json
+import pickle
+import time
+
+from utils.sqlite import SQLiteStore
+
+# Large enough to keep hashing throughput high, small enough to avoid a full copy of the payload.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def upload_key(contents, version=""):
+    """Content address of a ``dcc.Upload`` data URL: the sha256 of its base64 payload."""
+    digest = hashlib.sha256(str(version).encode())
+    offset = contents.find(",") + 1
+    for start in range(offset, len(contents), HASH_CHUNK_SIZE):
+        digest.update(contents[start:start + HASH_CHUNK_SIZE].encode("ascii"))
+    return digest.hexdigest()
+
+
+class StreamingUploadKey:
+    """``upload_key`` of a file fed as raw bytes in chunks, so raw and uploaded copies share cache entries."""
+
+    def __init__(self, version=""):
+        self.digest = hashlib.sha256(str(version).encode())
+        self.pending = b""
+
+    def update(self, chunk):
+        # Base64 of whole 3-byte groups concatenates to the base64 of the whole file.
+        data = self.pending + chunk
+        whole = len(data) - len(data) % 3
+        self.digest.update(base64.b64encode(data[:whole]))
+        self.pending = data[whole:]
+
+    def hexdigest(self):
+        digest = self.digest.copy()
+        digest.update(base64.b64encode(self.pending))
+        return digest.hexdigest()
+
+
+def merged_upload_key(keys):
+    # Order independent, so that selecting the same files in another order hits the cache.
+    return hashlib.sha256("merged:".join(sorted(keys)).encode()).hexdigest()
+
+
+def view_key(dataset_key, *parts):
+    """Key of a view derived from a stored dataset, e.g. one dashboard section under a set of filters."""
+    return hashlib.sha256(json.dumps([dataset_key, *parts], sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache(SQLiteStore):
+    """Pickled results in an SQLite file, shared by every worker process on the host.
+
+    Entries expire ``ttl_seconds`` after they are stored and the least recently used
+    ones are evicted whenever the stored size goes over ``max_bytes``. Hit and miss
+    counters are kept in the same file so that they add up across workers.
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS entries ("
+        " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+        " created_at REAL NOT NULL, accessed_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    ]
+
+    def __init__(self, path, max_bytes, ttl_seconds):
+        super().__init__(path)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                row = connection.execute(
+                    "SELECT value FROM entries WHERE key = ? AND created_at >= ?", (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row is None:
+                    self._increment(connection, "misses")
+                    return None
+                connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self._increment(connection, "hits")
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), now, now),
+                )
+                connection.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+                connection.execute(
+                    "DELETE FROM entries WHERE key IN ("
+                    " SELECT key FROM ("
+                    "  SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS retained FROM entries"
+                    " ) WHERE retained > ?"
+                    ")",
+                    (self.max_bytes,),
+                )
+
+    def stats(self):
+        if not self.enabled:
+            return {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}
+
+        with self._lock:
+            connection = self._connect()
+            counters = dict(connection.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"hits": counters.get("hits", 0), "misses": counters.get("misses", 0), "entries": entries,
+                "bytes": size}
+
+    @staticmethod
+    def _increment(connection, name):
+        connection.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
@@ -1,2 +1,38 @@
 NEEDED_DF_COLUMNS = ['Timestamp (UTC)', 'Transaction Description', 'Currency', 'Amount', 'To Currency', 'To Amount',
                      'Native Currency', 'Native Amount', 'Native Amount (in USD)', 'Transaction Kind']
+
+# Low-cardinality strings are loaded as categoricals. Amounts stay float64: crypto amounts carry
+# 8 decimals and fiat totals of large exports go beyond the 7 significant digits of float32.
+CATEGORY_COLUMNS = ['Transaction Description', 'Currency', 'To Currency', 'Native Currency', 'Transaction Kind']
+
+TRANSACTION_DTYPES = {
+    **{column: 'category' for column in CATEGORY_COLUMNS},
+    'Amount': 'float64',
+    'To Amount': 'float64',
+    'Native Amount': 'float64',
+    'Native Amount (in USD)': 'float64',
+}
+
+# Columns needed to filter a prepared frame and compute the dashboard totals.
+TOTALS_COLUMNS = ['Timestamp (UTC)', 'YearMonth', 'Transaction Description', 'Currency', 'Native Currency',
+                  'Native Amount', 'Native Amount (in USD)', 'Transaction Kind']
+
+PURCHASE_KIND = 'crypto_purchase'
+
+EARNING_KINDS = ['referral_card_cashback', 'mco_stake_reward', 'crypto_earn_interest_paid', 'reimbursement',
+                 'referral_gift']
+
+TRANSACTION_KIND_TITLES = {
+    'referral_card_cashback': 'Card cashback',
+    'mco_stake_reward': 'Stake rewards',
+    'crypto_earn_interest_paid': 'Earn',
+    'reimbursement': 'Reimbursement',
+    'referral_gift': 'Referral Gift',
+}
+
+AMOUNT_COLUMNS = ['Native Amount', 'Native Amount (in USD)']
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Kinds that move crypto in or out of the account without buying or selling it.
+TRANSFER_KINDS = ['crypto_withdrawal', 'crypto_deposit']
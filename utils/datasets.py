@@ -0,0 +1,74 @@
+import os
+import re
+import time
+import uuid
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+DATASET_KEY_PATTERN = re.compile(r"[0-9A-Za-z_-]{1,128}")
+
+
+def is_dataset_key(key):
+    return isinstance(key, str) and DATASET_KEY_PATTERN.fullmatch(key) is not None
+
+
+class DatasetStore:
+    """Prepared transaction frames kept on disk so views can be recomputed without a re-upload.
+
+    Frames are written as Parquet when pyarrow is installed and pickled otherwise.
+    Files that have not been written for ``ttl_seconds`` are removed on the next save,
+    a ``ttl_seconds`` of None keeps them until they are removed with their directory.
+    """
+
+    def __init__(self, directory, ttl_seconds):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.extension = ".parquet" if pyarrow is not None else ".pickle"
+
+    def save(self, key, df):
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_expired()
+
+        path = self._path(key)
+        # Written under a temporary name first so that readers never see a partial file.
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        if pyarrow is not None:
+            df.to_parquet(temporary_path, index=False)
+        else:
+            df.to_pickle(temporary_path)
+        os.replace(temporary_path, path)
+
+    def load(self, key, columns=None):
+        """The frame saved under ``key``, or None if it expired or the key is not a valid one."""
+        if not is_dataset_key(key):
+            return None
+        path = self._path(key)
+        try:
+            if pyarrow is not None:
+                return pd.read_parquet(path, columns=columns)
+            df = pd.read_pickle(path)
+        except FileNotFoundError:
+            return None
+        return df[columns] if columns is not None else df
+
+    def _path(self, key):
+        # Keys come from the browser, so they are checked before they become part of a path.
+        if not is_dataset_key(key):
+            raise ValueError(f"Invalid dataset key: {key!r}")
+        return os.path.join(self.directory, f"{key}{self.extension}")
+
+    def _remove_expired(self):
+        if self.ttl_seconds is None:
+            return
+        expired_before = time.time() - self.ttl_seconds
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < expired_before:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
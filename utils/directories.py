@@ -0,0 +1,16 @@
+import os
+import stat
+
+
+def ensure_private_directory(path):
+    """Create ``path`` for the current user only, or check that the existing directory is theirs.
+
+    Raises ``PermissionError`` when ``path`` is not a directory or belongs to another user;
+    a directory of the user that others may read is restricted to the user.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    status = os.lstat(path)
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid():
+        raise PermissionError(f"{path} must be a directory owned by the user running Croracle")
+    if stat.S_IMODE(status.st_mode) & 0o077:
+        os.chmod(path, 0o700)
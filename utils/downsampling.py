@@ -0,0 +1,52 @@
+import numpy as np
+
+
+def downsample(df, x_axis_data, y_axis_data, series, budget):
+    """Reduce ``df`` to about ``budget`` rows, keeping the visual shape of each series.
+
+    The budget is shared between the ``series`` groups in proportion to their size and
+    every group keeps its first and last point and the lowest and highest point of each
+    bucket along x, see ``min_max``. Groups that fit in their share are kept whole.
+    """
+    if len(df) <= budget:
+        return df
+
+    x = df[x_axis_data].to_numpy()
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("int64")
+    x = x.astype("float64")
+    y = df[y_axis_data].to_numpy(dtype="float64")
+
+    positions = []
+    for group_positions in df.groupby(series, sort=False, dropna=False, observed=True).indices.values():
+        share = max(4, budget * len(group_positions) // len(df))
+        ordered = group_positions[np.argsort(x[group_positions], kind="stable")]
+        if len(ordered) > share:
+            ordered = ordered[min_max(y[ordered], share)]
+        positions.append(ordered)
+
+    return df.iloc[np.sort(np.concatenate(positions))]
+
+
+def min_max(y, threshold):
+    """Positions of at most ``threshold`` points of the x-sorted series ``y`` that keep its outline.
+
+    The first and last points are kept, the others are split into buckets of equal length
+    that each keep their lowest and highest point. Unlike Largest-Triangle-Three-Buckets no
+    bucket depends on the one before, so all of them are reduced at once.
+    """
+    length = len(y)
+    if threshold >= length or threshold < 4:
+        return np.arange(length)
+
+    buckets = (threshold - 2) // 2
+    edges = np.linspace(0, length, buckets + 1).astype(np.int64)
+    sizes = np.diff(edges)
+    # One row per bucket; shorter buckets are padded with their own first position.
+    offsets = np.arange(sizes.max())
+    rows = edges[:-1, None] + np.where(offsets < sizes[:, None], offsets, 0)
+    values = y[rows]
+    bucket_rows = np.arange(buckets)
+    lowest = rows[bucket_rows, values.argmin(axis=1)]
+    highest = rows[bucket_rows, values.argmax(axis=1)]
+    return np.unique(np.concatenate([[0, length - 1], lowest, highest]))
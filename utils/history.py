@@ -0,0 +1,105 @@
+import contextlib
+import fcntl
+import os
+import pickle
+import re
+import shutil
+import time
+import uuid
+
+from utils.datasets import DatasetStore
+
+HISTORY_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+STATE_FILENAME = "state.pickle"
+LOCK_FILENAME = ".lock"
+
+
+def new_history_id():
+    return uuid.uuid4().hex
+
+
+def is_history_id(history_id):
+    return isinstance(history_id, str) and HISTORY_ID_PATTERN.fullmatch(history_id) is not None
+
+
+class HistoryStore:
+    """Per-user transaction histories that new exports are appended to.
+
+    Every history is a directory holding one frame per append, with only the rows that
+    were new at the time, next to a small pickled state: the revision, the row keys
+    seen so far and whatever totals the caller keeps up to date. Appends never rewrite
+    earlier frames. Histories that have not been appended to for ``ttl_seconds`` are
+    removed on the next append.
+    """
+
+    def __init__(self, directory, ttl_seconds):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+
+    @contextlib.contextmanager
+    def lock(self, history_id):
+        """Serialize appends to one history across every worker process on the host."""
+        directory = self._directory(history_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, LOCK_FILENAME), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get_state(self, history_id):
+        try:
+            with open(os.path.join(self._directory(history_id), STATE_FILENAME), "rb") as state_file:
+                return pickle.load(state_file)
+        except FileNotFoundError:
+            return None
+
+    def append(self, history_id, state, df):
+        """Store ``df`` as the frame of ``state["revision"]`` and make ``state`` the current one.
+
+        Must be called while holding ``lock(history_id)``.
+        """
+        self._remove_expired()
+        directory = self._directory(history_id)
+        self._parts(history_id).save(self._part_key(state["revision"]), df)
+
+        path = os.path.join(directory, STATE_FILENAME)
+        # The state is replaced last, so readers only ever see revisions whose frames are complete.
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "wb") as state_file:
+            pickle.dump(state, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    def load(self, history_id, revision, columns=None):
+        """Frames appended up to ``revision``, or None if the history has expired."""
+        parts = self._parts(history_id)
+        frames = []
+        for part_revision in range(1, revision + 1):
+            df = parts.load(self._part_key(part_revision), columns)
+            if df is None:
+                return None
+            frames.append(df)
+        return frames
+
+    def _parts(self, history_id):
+        return DatasetStore(self._directory(history_id), None)
+
+    def _directory(self, history_id):
+        # Ids come from the browser, so they are checked before they become part of a path.
+        if not is_history_id(history_id):
+            raise ValueError(f"Invalid history id: {history_id!r}")
+        return os.path.join(self.directory, history_id)
+
+    @staticmethod
+    def _part_key(revision):
+        return f"part-{revision:06d}"
+
+    def _remove_expired(self):
+        expired_before = time.time() - self.ttl_seconds
+        for entry in os.scandir(self.directory):
+            try:
+                if os.stat(os.path.join(entry.path, STATE_FILENAME)).st_mtime < expired_before:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,92 @@
+import pickle
+import time
+import uuid
+
+from utils.sqlite import SQLiteStore
+
+
+def no_progress(stage, steps=1):
+    pass
+
+
+class JobStore(SQLiteStore):
+    """Status, progress and results of background upload jobs.
+
+    Jobs are polled by whichever worker serves the next request, so their state lives
+    in SQLite rather than in the process that runs them. A job that has not reported
+    anything for ``ttl_seconds`` is treated as lost.
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT, completed INTEGER NOT NULL,"
+        " total INTEGER NOT NULL, result BLOB, error TEXT, updated_at REAL NOT NULL)",
+    ]
+
+    def __init__(self, path, ttl_seconds):
+        super().__init__(path)
+        self.ttl_seconds = ttl_seconds
+
+    def create(self, total_steps):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM jobs WHERE updated_at < ?", (now - self.ttl_seconds,))
+                connection.execute(
+                    "INSERT INTO jobs (id, status, completed, total, updated_at) VALUES (?, 'queued', 0, ?, ?)",
+                    (job_id, total_steps, now),
+                )
+        return job_id
+
+    def advance(self, job_id, stage, steps=1):
+        self._update(job_id, "status = 'running', stage = ?, completed = MIN(total, completed + ?)", stage, steps)
+
+    def finish(self, job_id, result):
+        self._update(job_id, "status = 'done', completed = total, result = ?",
+                     pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def fail(self, job_id, error):
+        self._update(job_id, "status = 'failed', error = ?", str(error))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT status, stage, completed, total, result, error, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        status, stage, completed, total, result, error, updated_at = row
+        if status in ("queued", "running") and updated_at < time.time() - self.ttl_seconds:
+            status, error = "failed", "The job stopped reporting progress."
+        return {
+            "status": status,
+            "stage": stage,
+            "completed": completed,
+            "total": total,
+            "result": pickle.loads(result) if result is not None else None,
+            "error": error,
+        }
+
+    def progress(self, job_id):
+        return JobProgress(self, job_id)
+
+    def _update(self, job_id, assignments, *values):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                                   (*values, time.time(), job_id))
+
+
+class JobProgress:
+    """Picklable progress callback that records the stages a job goes through."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+
+    def __call__(self, stage, steps=1):
+        self.store.advance(self.job_id, stage, steps)
@@ -0,0 +1,123 @@
+import bisect
+import contextlib
+import functools
+import logging
+import sqlite3
+import time
+
+import settings
+from utils.sqlite import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+BYTES_BUCKETS = [1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9]
+ROWS_BUCKETS = [1e2, 1e3, 1e4, 1e5, 1e6, 1e7]
+
+HISTOGRAMS = {
+    "croracle_stage_duration_seconds": ("Duration of upload processing stages.", DURATION_BUCKETS),
+    "croracle_stage_input_bytes": ("Input size in bytes of upload processing stages.", BYTES_BUCKETS),
+    "croracle_stage_input_rows": ("Input size in rows of upload processing stages.", ROWS_BUCKETS),
+    "croracle_request_duration_seconds": ("Duration of Dash callback requests.", DURATION_BUCKETS),
+    "croracle_response_size_bytes": ("Size of serialized Dash callback responses.", BYTES_BUCKETS),
+}
+
+
+class MetricsRegistry(SQLiteStore):
+    """Prometheus histograms kept in SQLite, so that a scrape of any worker sees all of them."""
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS buckets ("
+        " name TEXT NOT NULL, labels TEXT NOT NULL, bucket INTEGER NOT NULL, count INTEGER NOT NULL,"
+        " PRIMARY KEY (name, labels, bucket))",
+        "CREATE TABLE IF NOT EXISTS totals ("
+        " name TEXT NOT NULL, labels TEXT NOT NULL, sum REAL NOT NULL, count INTEGER NOT NULL,"
+        " PRIMARY KEY (name, labels))",
+    ]
+
+    def __init__(self, path, enabled=True):
+        super().__init__(path)
+        self.enabled = enabled
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+
+        bucket = bisect.bisect_left(HISTOGRAMS[name][1], value)
+        rendered_labels = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute(
+                        "INSERT INTO buckets (name, labels, bucket, count) VALUES (?, ?, ?, 1)"
+                        " ON CONFLICT(name, labels, bucket) DO UPDATE SET count = count + 1",
+                        (name, rendered_labels, bucket),
+                    )
+                    connection.execute(
+                        "INSERT INTO totals (name, labels, sum, count) VALUES (?, ?, ?, 1)"
+                        " ON CONFLICT(name, labels) DO UPDATE SET sum = sum + excluded.sum, count = count + 1",
+                        (name, rendered_labels, float(value)),
+                    )
+        except sqlite3.Error:
+            # Metrics must never fail an upload.
+            logger.exception("Could not record %s", name)
+
+    def render(self, gauges=None):
+        """Prometheus text exposition of every histogram plus ``gauges`` ({name: (help, value)})."""
+        lines = []
+        if self.enabled:
+            with self._lock:
+                connection = self._connect()
+                buckets = connection.execute("SELECT name, labels, bucket, count FROM buckets").fetchall()
+                totals = connection.execute("SELECT name, labels, sum, count FROM totals ORDER BY name, labels").fetchall()
+
+            counts = {}
+            for name, labels, bucket, count in buckets:
+                counts.setdefault((name, labels), {})[bucket] = count
+
+            for name, (description, bounds) in HISTOGRAMS.items():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for total_name, labels, total, count in totals:
+                    if total_name != name:
+                        continue
+                    prefix = f"{labels}," if labels else ""
+                    cumulative = 0
+                    for bucket, bound in enumerate(bounds + [float("inf")]):
+                        cumulative += counts[(name, labels)].get(bucket, 0)
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {total}")
+                    lines.append(f"{name}_count{{{labels}}} {count}")
+
+        for name, (description, value) in (gauges or {}).items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry(settings.METRICS_PATH, settings.METRICS_ENABLED)
+
+
+@contextlib.contextmanager
+def observe_stage(stage, size=None, unit="rows"):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe("croracle_stage_duration_seconds", time.perf_counter() - started, stage=stage)
+        if size is not None:
+            metrics.observe(f"croracle_stage_input_{unit}", size, stage=stage)
+
+
+def observed_figure(stage):
+    """Record the duration and row count of a figure builder whose first argument is its frame."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(df, *args, **kwargs):
+            with observe_stage(stage, len(df)):
+                return function(df, *args, **kwargs)
+        return wrapper
+    return decorator
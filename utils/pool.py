@@ -0,0 +1,39 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import settings
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _reset_executors_lock():
+    # Pools are forked from request threads; another one may have held the lock at that moment.
+    global _executors_lock
+    _executors_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executors_lock)
+
+
+def get_executor(name, max_workers):
+    with _executors_lock:
+        executor, pid = _executors.get(name, (None, None))
+        # Each gunicorn worker gets its own pools; one inherited through fork() would be unusable.
+        if executor is None or pid != os.getpid():
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+            _executors[name] = (executor, os.getpid())
+        return executor
+
+
+def map_uploads(function, *iterables):
+    """Apply ``function`` to every upload, in the process pool when there is more than one."""
+    arguments = list(zip(*iterables))
+    if len(arguments) <= 1 or settings.UPLOAD_PROCESS_WORKERS <= 1:
+        return [function(*argument) for argument in arguments]
+    return list(get_executor("uploads", settings.UPLOAD_PROCESS_WORKERS).map(function, *zip(*arguments)))
+
+
+def submit_job(function, *args):
+    return get_executor("jobs", settings.JOB_WORKERS).submit(function, *args)
@@ -0,0 +1,37 @@
+import contextlib
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+
+import settings
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def profile_if_slow(label):
+    """Profile the block and keep the profile only when it took longer than the slow-upload threshold."""
+    if not settings.SLOW_UPLOAD_SECONDS:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        duration = time.perf_counter() - started
+        if duration >= settings.SLOW_UPLOAD_SECONDS:
+            os.makedirs(settings.SLOW_UPLOAD_PROFILE_DIR, exist_ok=True)
+            path = os.path.join(settings.SLOW_UPLOAD_PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+            profiler.dump_stats(path)
+
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(20)
+            logger.warning("Slow upload %s took %.2fs, profile written to %s\n%s", label, duration, path,
+                           summary.getvalue())
@@ -0,0 +1,77 @@
+import datetime
+import json
+
+import numpy as np
+import pandas as pd
+import plotly
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from utils.metrics import metrics, observe_stage
+
+
+def to_json_ready(value):
+    """Turn components and figures into the plain JSON structure Dash sends to the browser.
+
+    The result pickles and loads in milliseconds, where pickled plotly figures are validated
+    all over again. With orjson installed, numpy arrays are encoded natively instead of going
+    through PlotlyJSONEncoder's encode, decode and re-encode passes.
+    """
+    with observe_stage("serialize"):
+        serialized = dumps(value)
+    metrics.observe("croracle_stage_input_bytes", len(serialized), stage="serialize")
+    return orjson.loads(serialized) if orjson is not None else json.loads(serialized)
+
+
+def set_dashboard_index(value, index):
+    """Point the pattern-matching ids of a ``to_json_ready`` layout at dashboard ``index``, in place.
+
+    Only ids and children are visited, figure data is left alone.
+    """
+    if isinstance(value, list):
+        for item in value:
+            set_dashboard_index(item, index)
+    elif isinstance(value, dict):
+        props = value.get("props") if "namespace" in value else None
+        if props is None:
+            for item in value.values():
+                set_dashboard_index(item, index)
+            return value
+        if isinstance(props.get("id"), dict) and "index" in props["id"]:
+            props["id"]["index"] = index
+        set_dashboard_index(props.get("children"), index)
+    return value
+
+
+def dumps(value):
+    if orjson is None:
+        return json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder)
+    return orjson.dumps(value, default=_to_orjson, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def _to_orjson(value):
+    # Dash components and plotly figures.
+    if hasattr(value, "to_plotly_json"):
+        return value.to_plotly_json()
+    if isinstance(value, (pd.Series, pd.Index)):
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray):
+        # orjson encodes contiguous numeric and datetime arrays natively; anything else becomes a list.
+        return np.ascontiguousarray(value) if value.dtype.kind in "biufM" else value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def compact_values(values, decimals):
+    """Round float values to the precision a figure shows, so the payload carries no more digits."""
+    if decimals is None or not pd.api.types.is_float_dtype(values):
+        return values
+    return values.round(decimals)
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import threading
+import weakref
+
+_stores = weakref.WeakSet()
+# Connections inherited through fork() belong to the parent. Closing one in the child could
+# checkpoint or remove the WAL file under the parent, so they are kept and never used.
+_inherited_connections = []
+
+
+class SQLiteStore:
+    """Base for state kept in an SQLite file so that every worker process on the host sees it.
+
+    Subclasses list their ``CREATE TABLE`` statements in ``SCHEMA``. Instances can be
+    pickled into pool processes; each process opens its own connection on first use.
+    A process forked while another thread held the lock of a store gets a fresh one.
+    """
+
+    SCHEMA = []
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        _stores.add(self)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_lock"] = None
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        _stores.add(self)
+
+    def _reset_after_fork(self):
+        if self._connection is not None:
+            _inherited_connections.append(self._connection)
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        # Connections must not be shared across fork(), so every worker opens its own.
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+
+def _reset_stores_after_fork():
+    for store in list(_stores):
+        store._reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_stores_after_fork)